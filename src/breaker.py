@@ -0,0 +1,78 @@
+import logging
+import time
+
+
+# stops scraping a website after it keeps blocking us, then probes it again
+# after an exponentially growing backoff
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, netloc, threshold, backoff, max_backoff, timefunc=time.monotonic):
+        self.netloc = netloc
+        self.threshold = threshold
+        self.base_backoff = backoff
+        self.max_backoff = max_backoff
+        self.timefunc = timefunc
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = backoff
+        self.retry_time = None
+        self.probing = False
+
+    # returns True if a request to this website may go out now
+    def allow(self):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self.timefunc() >= self.retry_time:
+            logging.info(f'{self.netloc} circuit breaker is half-open, sending a probe')
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logging.info(f'{self.netloc} circuit breaker is closed again')
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = self.base_backoff
+        self.probing = False
+
+    # returns True if this failure opened the breaker
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self.open()
+            return True
+        if self.state == self.CLOSED and self.failures >= self.threshold:
+            self.open()
+            return True
+        return False
+
+    # the probe ended without telling us anything, try again after the same backoff
+    def record_error(self):
+        if self.state == self.HALF_OPEN:
+            self.open()
+
+    def open(self):
+        logging.warning(f'{self.netloc} blocked {self.failures} times in a row, backing off for {self.backoff:.0f} seconds')
+        self.state = self.OPEN
+        self.probing = False
+        self.retry_time = self.timefunc() + self.backoff
+
+
+class CircuitBreakerRepo:
+    def __init__(self, threshold, backoff, max_backoff):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breakers = dict()
+
+    def get(self, netloc):
+        if netloc not in self.breakers:
+            self.breakers[netloc] = CircuitBreaker(netloc, self.threshold, self.backoff, self.max_backoff)
+        return self.breakers[netloc]
@@ -0,0 +1,124 @@
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import threading
+
+
+# keeps the most recent fetch latencies of every (website, driver) pair
+class LatencyTracker:
+    def __init__(self, window=100, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples  # no percentile until this many latencies were recorded
+        self.samples = dict()
+        self.lock = threading.Lock()
+
+    def record(self, key, latency):
+        with self.lock:
+            if key not in self.samples:
+                self.samples[key] = collections.deque(maxlen=self.window)
+            self.samples[key].append(latency)
+
+    def get_percentile(self, key, percentile):
+        with self.lock:
+            samples = sorted(self.samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(round((len(samples) - 1) * percentile / 100.0))]
+
+
+# tries the drivers of a scraper in order until one of them gets a usable
+# response (not a 403 and not a CAPTCHA); with hedging, the next driver is also
+# fired when the current one takes longer than its p95 latency for the website,
+# and whichever usable response comes first wins
+class DriverChain:
+    percentile = 95
+
+    def __init__(self, names, latency=None, executor=None):
+        self.names = names
+        self.latency = latency
+        self.executor = executor  # hedging is off without an executor to run the second driver on
+
+    def __repr__(self):
+        return ' -> '.join(self.names)
+
+    def get_hedge_delay(self, netloc, index):
+        if self.executor is None or self.latency is None or index + 1 >= len(self.names):
+            return None
+        return self.latency.get_percentile((netloc, self.names[index]), self.percentile)
+
+    # fetch(name) returns a result or None, is_usable(result) tells whether to stop there
+    def run(self, netloc, fetch, is_usable):
+        result, index = None, 0
+        while index < len(self.names):
+            delay = self.get_hedge_delay(netloc, index)
+            if delay is None:
+                result, fired = fetch(self.names[index]), 1
+            else:
+                result, fired = self.hedge(fetch, is_usable, self.names[index:index + 2], delay)
+            if is_usable(result):
+                return result
+            index += fired
+            if index < len(self.names):
+                logging.info(f'{netloc}: no usable response, falling through to the {self.names[index]} driver')
+        return result
+
+    def hedge(self, fetch, is_usable, names, delay):
+        started = threading.Event()
+
+        def fetch_first():
+            started.set()
+            return fetch(names[0])
+
+        futures = [self.executor.submit(fetch_first)]
+        # the delay counts from when the fetch starts, time spent queueing for a thread isn't latency
+        started.wait()
+        done, _ = concurrent.futures.wait(futures, timeout=delay)
+        if not done:
+            logging.debug(f'{names[0]} driver is slower than {delay:.2f}s, hedging with the {names[1]} driver')
+            futures.append(self.executor.submit(fetch, names[1]))
+
+        result = None
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                if is_usable(result):
+                    break
+        finally:
+            # a fetch which is still queued doesn't need to run anymore, one which is running ends with its timeout
+            for future in futures:
+                future.cancel()
+        return result, len(futures)
+
+    async def run_async(self, netloc, fetch, is_usable):
+        result, index = None, 0
+        while index < len(self.names):
+            delay = self.get_hedge_delay(netloc, index)
+            if delay is None:
+                result, fired = await fetch(self.names[index]), 1
+            else:
+                result, fired = await self.hedge_async(fetch, is_usable, self.names[index:index + 2], delay)
+            if is_usable(result):
+                return result
+            index += fired
+            if index < len(self.names):
+                logging.info(f'{netloc}: no usable response, falling through to the {self.names[index]} driver')
+        return result
+
+    async def hedge_async(self, fetch, is_usable, names, delay):
+        tasks = [asyncio.create_task(fetch(names[0]))]
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            logging.debug(f'{names[0]} driver is slower than {delay:.2f}s, hedging with the {names[1]} driver')
+            tasks.append(asyncio.create_task(fetch(names[1])))
+
+        result = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if is_usable(result):
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+        return result, len(tasks)
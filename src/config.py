@@ -1,3 +1,5 @@
+import logging
+import pathlib
 import urllib
 # 注意可能会遇到已安装ppyaml但还是无法找到yaml包的问题 解决方法是直接在vscode中的终端执行pip install pyyaml 即可
 import yaml
@@ -8,6 +10,7 @@ from collections import Counter
 class URL:
     def __init__(self, url):
         self.nickname = 'covfefe'
+        self.stop_markers = ()  # set by the scraper, see Scraper.get_stop_markers
         try:
             result = urllib.parse.urlparse(url)
             self.netloc = result.netloc
@@ -20,14 +23,32 @@ class URL:
         return self.url
 
 
+DRIVER_TYPES = ('requests', 'lean_and_mean', 'puppeteer', 'selenium')
+
+
 class Config:
-    def __init__(self, refresh_interval, max_price, urls):
+    def __init__(self, refresh_interval, max_price, urls, **kwargs):
         self.refresh_interval = float(refresh_interval)
         self.max_price = max_price
+        self.concurrency = int(kwargs.get('concurrency', 1))
+        self.domain_concurrency = kwargs.get('domain_concurrency', None)
+        self.rate_limits = kwargs.get('rate_limits', dict())
+        self.circuit_breaker = kwargs.get('circuit_breaker', parse_circuit_breaker(dict()))
+        self.requests = kwargs.get('requests', parse_requests(dict()))
+        self.selenium = kwargs.get('selenium', parse_selenium(dict()))
+        self.puppeteer = kwargs.get('puppeteer', parse_puppeteer(dict()))
+        self.lean_and_mean = kwargs.get('lean_and_mean', parse_lean_and_mean(dict()))
+        self.drivers = kwargs.get('drivers', dict())
+        self.hedging = kwargs.get('hedging', False)
+        self.streaming = kwargs.get('streaming', parse_streaming(dict()))
         self.urls = [URL(url) for url in urls]
+        self.name = kwargs.get('name', None)
 
         # 生成网站链接的别名
-        netloc_counter = Counter()
+        # (the counter is shared between configs hosted in the same process so nicknames stay unique)
+        netloc_counter = kwargs.get('netloc_counter', None)
+        if netloc_counter is None:
+            netloc_counter = Counter()
         for url in self.urls:
             netloc = url.netloc.lower()
             if netloc.startswith('www.'):
@@ -43,7 +64,7 @@ class Config:
             url.nickname = nickname
 
 #该方法根据yaml文件内容生成Config类 每个类包含刷新区间 最高价 网站链接列表
-def parse_config(f):
+def parse_config(f, **kwargs):
     data = yaml.safe_load(f)
     refresh_interval = data['refresh_interval'] if 'refresh_interval' in data else 1
 
@@ -54,5 +75,221 @@ def parse_config(f):
     if 'urls' not in data:
         raise Exception('config missing urls section')
 
+    concurrency = data['concurrency'] if 'concurrency' in data else 1
+    if concurrency < 1:
+        raise Exception('concurrency must be at least 1')
+
+    domain_concurrency = data['domain_concurrency'] if 'domain_concurrency' in data else None
+    if domain_concurrency is not None and domain_concurrency < 1:
+        raise Exception('domain_concurrency must be at least 1')
+
+    rate_limits = parse_rate_limits(data['rate_limits']) if 'rate_limits' in data else dict()
+
+    circuit_breaker = parse_circuit_breaker(data['circuit_breaker'] if 'circuit_breaker' in data else dict())
+    requests = parse_requests(data['requests'] if 'requests' in data else dict())
+    selenium = parse_selenium(data['selenium'] if 'selenium' in data else dict())
+    puppeteer = parse_puppeteer(data['puppeteer'] if 'puppeteer' in data else dict())
+    lean_and_mean = parse_lean_and_mean(data['lean_and_mean'] if 'lean_and_mean' in data else dict())
+    drivers = parse_drivers(data['drivers']) if 'drivers' in data else dict()
+    hedging = bool(data['hedging']) if 'hedging' in data else False
+    streaming = parse_streaming(data['streaming'] if 'streaming' in data else dict())
+
     urls = sorted(set([url for url in data['urls'] if url]))
-    return Config(refresh_interval, max_price, urls)
+    return Config(refresh_interval, max_price, urls, concurrency=concurrency, domain_concurrency=domain_concurrency,
+                  rate_limits=rate_limits, circuit_breaker=circuit_breaker, requests=requests, selenium=selenium, puppeteer=puppeteer,
+                  lean_and_mean=lean_and_mean, drivers=drivers, hedging=hedging, streaming=streaming, **kwargs)
+
+
+# the drivers to try, in order, for a website (or "amazon.com" for www.amazon.com too),
+# instead of the single driver its scraper uses
+def parse_drivers(data):
+    drivers = dict()
+    for netloc, names in data.items():
+        if isinstance(names, str):
+            names = [names]
+        for name in names:
+            if name not in DRIVER_TYPES:
+                raise Exception(f'unknown driver for {netloc}: {name}, must be one of {", ".join(DRIVER_TYPES)}')
+        if not names:
+            raise Exception(f'no drivers given for {netloc}')
+        drivers[netloc.lower()] = list(names)
+    return drivers
+
+
+# the requests and lean_and_mean drivers may stop reading a page once the
+# scraper's stop markers (or the ones given here per website) went by, or after max_bytes
+def parse_streaming(data):
+    enabled = bool(data['enabled']) if 'enabled' in data else False
+    max_bytes = int(data['max_bytes']) if 'max_bytes' in data and data['max_bytes'] is not None else None
+    if max_bytes is not None and max_bytes < 1:
+        raise Exception('streaming max_bytes must be positive')
+    stop_markers = dict()
+    for netloc, markers in (data['stop_markers'] if 'stop_markers' in data else dict()).items():
+        stop_markers[netloc.lower()] = [markers] if isinstance(markers, str) else list(markers)
+    return {'enabled': enabled, 'max_bytes': max_bytes, 'stop_markers': stop_markers}
+
+
+# the requests driver keeps one session per website with up to `pool_size` kept-alive connections
+def parse_requests(data):
+    pool_size = data['pool_size'] if 'pool_size' in data else 4
+    if pool_size < 1:
+        raise Exception('requests pool_size must be at least 1')
+    http2 = bool(data['http2']) if 'http2' in data else False
+    return {'pool_size': int(pool_size), 'http2': http2}
+
+
+# the selenium driver keeps `pool_size` browsers running and restarts each one after `recycle_after` pages
+def parse_selenium(data):
+    pool_size = data['pool_size'] if 'pool_size' in data else 1
+    recycle_after = data['recycle_after'] if 'recycle_after' in data else 100
+    if pool_size < 1 or recycle_after < 1:
+        raise Exception('selenium pool_size and recycle_after must be at least 1')
+    return {'pool_size': int(pool_size), 'recycle_after': int(recycle_after)}
+
+
+# the puppeteer driver only saves a screenshot of every page when asked to
+def parse_puppeteer(data):
+    return {'screenshot': bool(data['screenshot']) if 'screenshot' in data else False}
+
+
+# the lean_and_mean worker may compress the pages it sends back with gzip or zstd,
+# or parse them itself and only send back the result; processes and socket must
+# match the --processes and --socket the worker was started with, unless spawn
+# lets the hunter start the worker itself
+def parse_lean_and_mean(data):
+    compression = data['compression'] if 'compression' in data else None
+    if compression is not None and compression not in ('gzip', 'zstd'):
+        raise Exception('lean_and_mean compression must be gzip or zstd')
+    parse = bool(data['parse']) if 'parse' in data else False
+    processes = int(data['processes']) if 'processes' in data else 1
+    if processes < 1:
+        raise Exception('lean_and_mean processes must be at least 1')
+    socket = data['socket'] if 'socket' in data else None
+    spawn = data['spawn'] if 'spawn' in data else None
+    if spawn is not None and spawn not in ('thread', 'process', 'shared'):
+        raise Exception('lean_and_mean spawn must be thread, process or shared')
+    if spawn == 'thread' and processes > 1:
+        raise Exception('a lean_and_mean worker spawned on a thread runs a single process')
+    return {'compression': compression, 'parse': parse, 'processes': processes, 'socket': socket, 'spawn': spawn}
+
+
+# parses every given config file, or every *.yaml file in the given directories,
+# so that several product configs can be hosted by a single process
+def parse_configs(paths):
+    configs = []
+    netloc_counter = Counter()
+    for path in [pathlib.Path(p) for p in paths]:
+        if path.is_dir():
+            for child in sorted(path.glob('*.yaml')):
+                with child.open('r') as f:
+                    data = yaml.safe_load(f)
+                # directories may also hold alerter configs and the like
+                if not isinstance(data, dict) or 'urls' not in data:
+                    logging.info(f'skipping {child}, it has no urls section')
+                    continue
+                with child.open('r') as f:
+                    configs.append(parse_config(f, name=child.stem, netloc_counter=netloc_counter))
+        else:
+            with path.open('r') as f:
+                configs.append(parse_config(f, name=path.stem, netloc_counter=netloc_counter))
+
+    if not configs:
+        raise Exception(f'no configs found in: {" ".join(str(p) for p in paths)}')
+    return configs
+
+
+# combines the settings that are shared by every config hosted in the process:
+# the most generous concurrency, the strictest rate limits and circuit breakers,
+# and the longest refresh interval (which the drivers use for their timeouts)
+def merge_configs(configs):
+    if len(configs) == 1:
+        return configs[0]
+
+    concurrency = max(c.concurrency for c in configs)
+
+    domain_concurrencies = [c.domain_concurrency for c in configs if c.domain_concurrency is not None]
+    domain_concurrency = min(domain_concurrencies) if domain_concurrencies else None
+
+    rate_limits = dict()
+    for c in configs:
+        for netloc, limit in c.rate_limits.items():
+            if netloc not in rate_limits or limit['rate'] < rate_limits[netloc]['rate']:
+                rate_limits[netloc] = limit
+
+    circuit_breaker = {
+        'threshold': min(c.circuit_breaker['threshold'] for c in configs),
+        'backoff': max(c.circuit_breaker['backoff'] for c in configs),
+        'max_backoff': max(c.circuit_breaker['max_backoff'] for c in configs),
+    }
+
+    requests = {
+        'pool_size': max(c.requests['pool_size'] for c in configs),
+        'http2': any(c.requests['http2'] for c in configs),
+    }
+
+    selenium = {
+        'pool_size': max(c.selenium['pool_size'] for c in configs),
+        'recycle_after': min(c.selenium['recycle_after'] for c in configs),
+    }
+
+    puppeteer = {
+        'screenshot': any(c.puppeteer['screenshot'] for c in configs),
+    }
+
+    compressions = [c.lean_and_mean['compression'] for c in configs if c.lean_and_mean['compression'] is not None]
+    lean_and_mean = {
+        'compression': compressions[0] if compressions else None,
+        'parse': any(c.lean_and_mean['parse'] for c in configs),
+        'processes': max(c.lean_and_mean['processes'] for c in configs),
+        'socket': next((c.lean_and_mean['socket'] for c in configs if c.lean_and_mean['socket']), None),
+        'spawn': next((c.lean_and_mean['spawn'] for c in configs if c.lean_and_mean['spawn']), None),
+    }
+
+    # the first config giving a website a chain of drivers wins
+    drivers = dict()
+    for c in configs:
+        for netloc, names in c.drivers.items():
+            drivers.setdefault(netloc, names)
+
+    # never cut a page shorter than any of the configs asked for
+    max_bytes = [c.streaming['max_bytes'] for c in configs]
+    streaming = {
+        'enabled': any(c.streaming['enabled'] for c in configs),
+        'max_bytes': None if None in max_bytes else max(max_bytes),
+        'stop_markers': dict(),
+    }
+    for c in configs:
+        for netloc, markers in c.streaming['stop_markers'].items():
+            streaming['stop_markers'].setdefault(netloc, markers)
+
+    refresh_interval = max(c.refresh_interval for c in configs)
+    return Config(refresh_interval, None, [], concurrency=concurrency, domain_concurrency=domain_concurrency,
+                  rate_limits=rate_limits, circuit_breaker=circuit_breaker, requests=requests, selenium=selenium, puppeteer=puppeteer,
+                  lean_and_mean=lean_and_mean, drivers=drivers, hedging=any(c.hedging for c in configs), streaming=streaming, name='merged')
+
+
+# rate limits are given per netloc (or "default") as requests per second plus a burst size
+def parse_rate_limits(data):
+    rate_limits = dict()
+    for netloc, limit in data.items():
+        rate = limit['rate'] if 'rate' in limit else None
+        if rate is None or rate <= 0:
+            raise Exception(f'rate limit for {netloc} must have a positive rate')
+        burst = limit['burst'] if 'burst' in limit else 1
+        if burst < 1:
+            raise Exception(f'rate limit burst for {netloc} must be at least 1')
+        rate_limits[netloc] = {'rate': float(rate), 'burst': int(burst)}
+    return rate_limits
+
+
+# a website is backed off after `threshold` blocked scrapes in a row, for `backoff`
+# seconds at first and twice as long after every failed probe, up to `max_backoff`
+def parse_circuit_breaker(data):
+    threshold = data['threshold'] if 'threshold' in data else 3
+    if threshold < 1:
+        raise Exception('circuit_breaker threshold must be at least 1')
+    backoff = data['backoff'] if 'backoff' in data else 60
+    max_backoff = data['max_backoff'] if 'max_backoff' in data else 3600
+    if backoff <= 0 or max_backoff < backoff:
+        raise Exception('circuit_breaker backoff must be positive and no larger than max_backoff')
+    return {'threshold': int(threshold), 'backoff': float(backoff), 'max_backoff': float(max_backoff)}
@@ -0,0 +1,44 @@
+import time
+
+from driver import Driver, DriverRepo, HttpGetResponse
+
+
+# helpers shared by the tests, which import them with "from conftest import ..."
+
+
+# a clock for the timefunc of the scheduler, the rate limiter and the circuit
+# breaker, which only moves when a test sets its now
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# answers every request with the same page, which a test may change in between
+class PageDriver(Driver):
+    def __init__(self, text, status_code=200, delay=0):
+        super().__init__()
+        self.text = text
+        self.status_code = status_code
+        self.delay = delay
+        self.calls = 0
+
+    def get_impl(self, url):
+        self.calls += 1
+        time.sleep(self.delay)
+        return HttpGetResponse(self.text, str(url), status_code=self.status_code)
+
+
+# a real DriverRepo, with the given drivers in place of the real ones (and none for the others)
+class FakeDriverRepo(DriverRepo):
+    def __init__(self, data_dir, drivers, **kwargs):
+        self.fakes = drivers
+        super().__init__(timeout=10, data_dir=data_dir, **kwargs)
+
+    def create_driver(self, name, driver_type, **kwargs):
+        driver = self.fakes.get(name)
+        if driver is not None and kwargs['limiter'] is not None:
+            driver.limiter = kwargs['limiter']
+        return driver
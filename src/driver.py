@@ -1,19 +1,39 @@
+import aiohttp
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import copy
 import getpass
+import itertools
+import json
 import logging
 import os
 import pathlib
+import queue
 import random
 import re
 import requests
 import shutil
 import string
 import subprocess
+import threading
+import weakref
 
 from abc import ABC, abstractmethod
 from selenium import webdriver
+from chain import DriverChain, LatencyTracker
+from ratelimit import RateLimiter
+from streaming import CHUNK_SIZE, StreamReader
 import worker
 
 from fake_useragent import UserAgent
+
+try:
+    import httpx  # optional, only needed for http2
+except ImportError:
+    httpx = None
+
 ua=UserAgent()
 user_agent=ua.random
 print(pathlib.Path('selenium').resolve())
@@ -25,17 +45,105 @@ class HttpGetResponse:
         self.text = text
         self.url = url
         self.status_code = kwargs.get('status_code', None)
+        self.content = kwargs.get('content', None)  # the raw bytes, when the driver has them
+        self.headers = kwargs.get('headers', dict())
+        self.result = kwargs.get('result', None)  # set instead of text when a worker parsed the page
+        self.truncated = kwargs.get('truncated', False)  # the driver stopped reading the page early
 
 
 class Driver(ABC):
     def __init__(self, **kwargs):
         self.data_dir = kwargs.get('data_dir')
         self.timeout = kwargs.get('timeout')
+        self.limiter = kwargs.get('limiter')
+        # drivers which can read pages chunk by chunk stop at the url's stop markers or after max_bytes
+        self.streaming = kwargs.get('streaming', False)
+        self.max_bytes = kwargs.get('max_bytes', None)
+
+    def should_stream(self, url):
+        return self.streaming and bool(url.stop_markers or self.max_bytes)
 
-    @abstractmethod
     def get(self, url) -> HttpGetResponse:
+        # every driver shares the same per-website rate limits
+        if self.limiter is not None:
+            self.limiter.acquire(url.netloc)
+        return self.get_impl(url)
+
+    async def get_async(self, url) -> HttpGetResponse:
+        if self.limiter is not None:
+            await self.limiter.acquire_async(url.netloc)
+        return await self.get_impl_async(url)
+
+    @abstractmethod
+    def get_impl(self, url) -> HttpGetResponse:
         pass
 
+    # drivers without a native async implementation run get_impl on a thread
+    async def get_impl_async(self, url) -> HttpGetResponse:
+        return await asyncio.to_thread(self.get_impl, url)
+
+
+# keeps a few long-lived browsers around instead of starting one per request;
+# each browser gets its own profile directory so that several can run at once
+class BrowserPool:
+    def __init__(self, factory, size, recycle_after):
+        self.factory = factory
+        self.recycle_after = recycle_after
+        self.slots = queue.Queue()
+        for slot in range(size):
+            self.slots.put((slot, None, 0))
+
+    @contextlib.contextmanager
+    def browser(self):
+        slot, browser, pages = self.slots.get()
+        if browser is not None and not self.is_healthy(browser):
+            logging.warning(f'browser {slot} is no longer responding, replacing it')
+            self.quit(browser)
+            browser = None
+        if browser is None:
+            logging.debug(f'starting browser {slot}')
+            try:
+                browser, pages = self.factory(slot), 0
+            except Exception:
+                # chrome or chromedriver failed to start, the slot is free for the next try
+                self.slots.put((slot, None, 0))
+                raise
+
+        ok = False
+        try:
+            yield browser
+            ok = True
+        finally:
+            pages += 1
+            # headless chromium crashes somewhat regularly and slowly leaks memory,
+            # so browsers are recycled after an error or after a number of pages
+            if not ok or pages >= self.recycle_after:
+                logging.debug(f'recycling browser {slot} after {pages} pages')
+                self.quit(browser)
+                browser = None
+            self.slots.put((slot, browser, pages))
+
+    @staticmethod
+    def is_healthy(browser):
+        try:
+            browser.window_handles
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def quit(browser):
+        try:
+            browser.quit()
+        except Exception as e:
+            logging.debug(f'unable to quit browser: {e}')
+
+    def close(self):
+        while not self.slots.empty():
+            _, browser, _ = self.slots.get_nowait()
+            if browser is not None:
+                self.quit(browser)
+
 
 class SeleniumDriver(Driver):
     #初始化webdriver.Chrome的地址并更改chrome配置
@@ -98,7 +206,7 @@ class SeleniumDriver(Driver):
         # 使用上面生成的随即代理
         self.options.add_argument(f'--user-agent="{user_agent}"')
         # 添加数据缓存路径 selenium_path='C:\Users\yubin001\Desktop\DevTest\GitProjects\inventory-hunter\selenium'
-        self.options.add_argument(f'--user-data-dir={self.selenium_path}')
+        # (every browser in the pool gets its own profile directory below this path, see create_browser)
         # 设置窗口位置 
         self.options.add_argument('--window-position=0,0')
         self.options.add_argument('--window-size=1920,1080')
@@ -112,11 +220,23 @@ class SeleniumDriver(Driver):
                 }
         self.options.add_experimental_option('prefs', prefs)
 
+        self.pool = BrowserPool(self.create_browser, kwargs.get('pool_size', 1), kwargs.get('recycle_after', 100))
+        atexit.register(self.pool.close)
+
+    def create_browser(self, slot):
+        profile_dir = self.selenium_path / f'profile_{slot}'
+        options = copy.deepcopy(self.options)
+        options.add_argument(f'--user-data-dir={profile_dir}')
+        driver = webdriver.Chrome(self.driver_path, options=options)
+        if self.timeout:
+            driver.set_page_load_timeout(self.timeout)
+        return driver
+
     #返回网站的信息并保存一个截屏
-    def get(self, url) -> HttpGetResponse:
-        # headless chromium crashes somewhat regularly...
-        # for now, we will start a fresh instance every time
-        with webdriver.Chrome(self.driver_path, options=self.options) as driver:
+    # (webdriver has no async api, so get_impl_async runs this on a thread; the
+    # browser pool bounds how many of those threads actually drive a browser)
+    def get_impl(self, url) -> HttpGetResponse:
+        with self.pool.browser() as driver:
             driver.get(str(url))
 
             try:
@@ -129,63 +249,306 @@ class SeleniumDriver(Driver):
             return HttpGetResponse(driver.page_source, url)
 
 
+# talks to a long-lived node sidecar (scrape.js --serve) which keeps a browser open
+# and answers newline-delimited JSON requests over its stdin/stdout
 class PuppeteerDriver(Driver):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.script_path = pathlib.Path(__file__).parent.absolute() / 'scrape.js'
         if not self.script_path.exists():
             raise Exception(f'does not exist: {self.script_path}')
+        self.screenshot = kwargs.get('screenshot', False)
+        self.process = None
+        self.pending = None
+        self.request_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        atexit.register(self.stop)
 
-    def get(self, url) -> HttpGetResponse:
-        html_file = self.data_dir / f'{url.nickname}.html'
-        png_file = self.data_dir / f'{url.nickname}.png'
-        cmd = ['node', self.script_path, str(url), html_file, png_file]
-        r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False, text=True)
-        if r.returncode != 0:
-            logging.warning(f'puppeteer scrape failed: {r.stdout}')
-        else:
-            with open(html_file, 'r',encoding='utf-8') as f:
-                content = f.read()
-                return HttpGetResponse(content, url)
+    def start(self):
+        logging.debug('starting puppeteer sidecar')
+        self.process = subprocess.Popen(['node', self.script_path, '--serve'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, encoding='utf-8', bufsize=1)
+        # every process gets its own requests, so that one exiting only fails what was sent to it
+        self.pending = dict()
+        threading.Thread(target=self.read_responses, args=(self.process, self.pending), daemon=True).start()
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    # runs on a background thread, hands every response to the request waiting for it
+    def read_responses(self, process, pending):
+        for line in process.stdout:
+            try:
+                response = json.loads(line)
+            except ValueError:
+                logging.warning(f'unexpected output from puppeteer sidecar: {line.strip()}')
+                continue
+            with self.lock:
+                future = pending.pop(response.get('id'), None)
+            if future is not None:
+                future.set_result(response)
+
+        logging.warning(f'puppeteer sidecar exited with code {process.wait()}')
+        with self.lock:
+            futures = list(pending.values())
+            pending.clear()
+        for future in futures:
+            future.set_exception(Exception('puppeteer sidecar exited'))
+
+    def get_impl(self, url) -> HttpGetResponse:
+        pending, request_id, future, timeout = self.submit(url)
+        try:
+            # leave the sidecar some time to start its browser on top of the page timeout
+            response = future.result(timeout=timeout + 30)
+        except concurrent.futures.TimeoutError:
+            with self.lock:
+                pending.pop(request_id, None)
+            raise
+        return self.make_response(url, response)
 
+    async def get_impl_async(self, url) -> HttpGetResponse:
+        pending, request_id, future, timeout = self.submit(url)
+        try:
+            response = await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout + 30)
+        except asyncio.TimeoutError:
+            with self.lock:
+                pending.pop(request_id, None)
+            raise
+        return self.make_response(url, response)
 
+    # sends a request to the sidecar, the returned future resolves to its response;
+    # also returns the requests of the process it went to, to drop it from on a timeout
+    def submit(self, url):
+        timeout = self.timeout if self.timeout else 30
+        future = concurrent.futures.Future()
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self.start()
+            request_id = next(self.request_ids)
+            self.pending[request_id] = future
+            request = {
+                'id': request_id,
+                'url': str(url),
+                'screenshot': str(self.data_dir / f'{url.nickname}.png') if self.screenshot else None,
+                'timeout': timeout * 1000,
+            }
+            self.process.stdin.write(json.dumps(request) + '\n')
+            self.process.stdin.flush()
+            pending = self.pending
+        return pending, request_id, future, timeout
+
+    def make_response(self, url, response):
+        if 'error' in response:
+            logging.warning(f'puppeteer scrape failed: {response["error"]}')
+            return None
+        return HttpGetResponse(response['html'], url, status_code=response.get('status'))
+
+
+# keeps one session per website so connections (and cookies) are reused between
+# scrapes instead of doing a new TCP and TLS handshake every time
 class RequestsDriver(Driver):
-    def get(self, url) -> HttpGetResponse:
-        headers = {'user-agent': user_agent, 'referer': 'https://google.com'}
-        r = requests.get(str(url), headers=headers, timeout=self.timeout)
-        if not r.ok:
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.pool_size = kwargs.get('pool_size', 4)
+        self.http2 = kwargs.get('http2', False)
+        if self.http2 and httpx is None:
+            logging.warning('http2 requires the httpx package (pip install httpx[http2]), falling back to HTTP/1.1')
+            self.http2 = False
+        self.headers = {'user-agent': user_agent, 'referer': 'https://google.com'}
+        self.sessions = dict()
+        self.async_sessions = weakref.WeakKeyDictionary()  # event loop -> session, sessions can't be shared between loops
+        self.lock = threading.Lock()
+
+    def create_session(self):
+        if self.http2:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            return httpx.Client(http2=True, headers=self.headers, limits=limits, follow_redirects=True)
+
+        session = requests.Session()
+        session.headers.update(self.headers)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get_session(self, netloc):
+        with self.lock:
+            if netloc not in self.sessions:
+                self.sessions[netloc] = self.create_session()
+            return self.sessions[netloc]
+
+    def get_impl(self, url) -> HttpGetResponse:
+        if self.should_stream(url):
+            return self.get_streaming(url)
+        r = self.get_session(url.netloc).get(str(url), timeout=self.timeout)
+        if r.status_code >= 400:
             logging.debug(f'got response with status code {r.status_code} for {url}')
-        return HttpGetResponse(r.text, r.url, status_code=r.status_code)
+        return HttpGetResponse(r.text, str(r.url), status_code=r.status_code)
+
+    # reads the page chunk by chunk and drops the connection as soon as enough was read
+    def get_streaming(self, url) -> HttpGetResponse:
+        reader = StreamReader(url.stop_markers, self.max_bytes)
+        session = self.get_session(url.netloc)
+        if self.http2:
+            with session.stream('GET', str(url), timeout=self.timeout) as r:
+                for chunk in r.iter_bytes(CHUNK_SIZE):
+                    if reader.feed(chunk):
+                        break
+                status_code, final_url, encoding = r.status_code, str(r.url), r.encoding
+        else:
+            with session.get(str(url), timeout=self.timeout, stream=True) as r:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    if reader.feed(chunk):
+                        break
+                status_code, final_url, encoding = r.status_code, r.url, r.encoding
+
+        if reader.truncated:
+            logging.debug(f'stopped reading {url} after {reader.size} bytes')
+        content = reader.body
+        text = content.decode(encoding or 'utf-8', errors='replace')
+        return HttpGetResponse(text, final_url, status_code=status_code, content=content, truncated=reader.truncated)
+
+    def create_async_session(self):
+        if self.http2:
+            limits = httpx.Limits(max_keepalive_connections=self.pool_size)
+            return httpx.AsyncClient(http2=True, headers=self.headers, limits=limits, follow_redirects=True)
+        connector = aiohttp.TCPConnector(limit_per_host=self.pool_size)
+        return aiohttp.ClientSession(connector=connector, headers=self.headers)
+
+    def get_async_session(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self.async_sessions:
+            self.async_sessions[loop] = self.create_async_session()
+        return self.async_sessions[loop]
+
+    async def get_impl_async(self, url) -> HttpGetResponse:
+        session = self.get_async_session()
+        if self.http2:
+            if self.should_stream(url):
+                return await asyncio.to_thread(self.get_streaming, url)
+            r = await session.get(str(url), timeout=self.timeout)
+            return HttpGetResponse(r.text, str(r.url), status_code=r.status_code)
+
+        async with session.get(str(url), timeout=aiohttp.ClientTimeout(total=self.timeout)) as r:
+            truncated = False
+            if self.should_stream(url):
+                reader = StreamReader(url.stop_markers, self.max_bytes)
+                async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                    if reader.feed(chunk):
+                        break
+                content, truncated = reader.body, reader.truncated
+            else:
+                content = await r.read()
+            if r.status >= 400:
+                logging.debug(f'got response with status code {r.status} for {url}')
+            text = content.decode(r.charset or 'utf-8', errors='replace')
+            return HttpGetResponse(text, str(r.url), status_code=r.status, content=content, headers=dict(r.headers), truncated=truncated)
+
+    # closes the async session of the running event loop, call before the loop goes away
+    async def close_async(self):
+        session = self.async_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await (session.aclose() if self.http2 else session.close())
 
 # 该模块用了aiohttp模块 创建了一个服务器+客户端 使用谷歌的protobuf处理字节流 优点是更快速
 class LeanAndMeanDriver(Driver):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # with spawn set, the driver starts the worker itself and waits for it to come up
+        spawn = kwargs.get('spawn', None)
+        self.worker = worker.init_worker('lean_and_mean', spawn, socket=kwargs.get('socket', None),
+                                         processes=kwargs.get('processes', 1)) if spawn else None
         #init_client函数定义在worker模块下的__init__初始化模块中
-        self.client = worker.init_client('lean_and_mean')
+        self.client = worker.init_client('lean_and_mean', socket=kwargs.get('socket', None),
+                                         compression=kwargs.get('compression', None), processes=kwargs.get('processes', 1))
+        self.parse = kwargs.get('parse', False)
 
-    def get(self, url) -> HttpGetResponse:
-        response = self.client.get(
-            request_id=1337,  # doesn't matter right now
-            url=str(url),
-            timeout=self.timeout,
-        )
+    def get_impl(self, url) -> HttpGetResponse:
+        response = self.client.get(url=str(url), timeout=self.timeout, parse=self.parse, **self.get_stream_args(url))
+        return self.make_response(url, response)
+
+    async def get_impl_async(self, url) -> HttpGetResponse:
+        response = await self.client.get_async(url=str(url), timeout=self.timeout, parse=self.parse, **self.get_stream_args(url))
+        return self.make_response(url, response)
+
+    # the worker does the streaming
+    def get_stream_args(self, url):
+        if not self.should_stream(url):
+            return dict()
+        return {'stop_markers': url.stop_markers, 'max_bytes': self.max_bytes}
 
-        return HttpGetResponse(response.data, url, status_code=response.status_code)
+    def make_response(self, url, response) -> HttpGetResponse:
+        if response.busy:
+            raise Exception(f'lean_and_mean worker is too busy to fetch {url}')
+        if not response.status_code:
+            raise Exception(f'lean_and_mean worker failed to fetch {url}')
+
+        if response.HasField('result'):
+            logging.debug(f'{url} fetched and parsed by the worker in {response.fetch_ms} ms')
+            return HttpGetResponse('', response.final_url or url, status_code=response.status_code, result=response.result,
+                                   truncated=response.truncated)
+
+        logging.debug(f'{url} fetched by the worker in {response.fetch_ms} ms ({response.ttfb_ms} ms to first byte)')
+        text = response.body.decode(response.charset or 'utf-8', errors='replace')
+        headers = {h.name: h.value for h in response.headers}
+        return HttpGetResponse(text, response.final_url or url, status_code=response.status_code, content=response.body, headers=headers,
+                               truncated=response.truncated)
 
 
 class DriverRepo:
-    def __init__(self, timeout):
+    def __init__(self, timeout, limiter=None, requests=None, selenium=None, puppeteer=None, lean_and_mean=None,
+                 chains=None, hedge_workers=0, streaming=None, data_dir='data'):
         #resolve函数将路径中所有的省略符号都去除 例如“..”等 返回绝对的路径
-        self.data_dir = pathlib.Path('data').resolve()
+        self.data_dir = pathlib.Path(data_dir).resolve()
         #mkdir函数新建data_dir目录
         self.data_dir.mkdir(exist_ok=True)
-        self.requests = RequestsDriver(data_dir=self.data_dir, timeout=timeout)
-        self.selenium = SeleniumDriver(data_dir=self.data_dir, timeout=timeout)
-        self.puppeteer = PuppeteerDriver(data_dir=self.data_dir, timeout=timeout)
-        self.lean_and_mean = LeanAndMeanDriver(data_dir=self.data_dir, timeout=timeout)
+        self.limiter = limiter
+        kwargs = {'data_dir': self.data_dir, 'timeout': timeout, 'limiter': limiter}
+        self.streaming = streaming or {'enabled': False, 'max_bytes': None, 'stop_markers': dict()}
+        stream_kwargs = {'streaming': self.streaming['enabled'], 'max_bytes': self.streaming['max_bytes']}
+        self.requests = self.create_driver('requests', RequestsDriver, **kwargs, **stream_kwargs, **(requests or dict()))
+        self.selenium = self.create_driver('selenium', SeleniumDriver, **kwargs, **(selenium or dict()))
+        self.puppeteer = self.create_driver('puppeteer', PuppeteerDriver, **kwargs, **(puppeteer or dict()))
+        self.lean_and_mean = self.create_driver('lean_and_mean', LeanAndMeanDriver, **kwargs, **stream_kwargs, **(lean_and_mean or dict()))
+
+        # ordered drivers per website, see DriverChain
+        self.chains = {netloc.lower(): names for netloc, names in (chains or dict()).items()}
+        self.latency = LatencyTracker()
+        self.hedge_executor = concurrent.futures.ThreadPoolExecutor(hedge_workers) if hedge_workers else None
+
+    # the tests swap in drivers which don't need a browser, a worker or the network
+    def create_driver(self, name, driver_type, **kwargs):
+        return driver_type(**kwargs)
+
+    def get_chain(self, netloc, default):
+        # "amazon.com" also covers "www.amazon.com"
+        netloc = netloc.lower()
+        for domain, names in self.chains.items():
+            if netloc == domain or netloc.endswith(f'.{domain}'):
+                return DriverChain(names, self.latency, self.hedge_executor)
+        return DriverChain([default], self.latency, self.hedge_executor)
+
+    # the config's stop markers for a website win over the scraper's own
+    def get_stop_markers(self, netloc, default):
+        if not self.streaming['enabled']:
+            return ()
+        netloc = netloc.lower()
+        for domain, markers in self.streaming['stop_markers'].items():
+            if netloc == domain or netloc.endswith(f'.{domain}'):
+                return tuple(marker.encode() for marker in markers)
+        return tuple(default)
 
 #初始化每一个类型的driver
 def init_drivers(config):
     timeout = int(max(config.refresh_interval, 15))  # in seconds
-    return DriverRepo(timeout)
+    limiter = RateLimiter(config.rate_limits)
+    # a hedged scrape runs its first fetch on the pool too, so every scrape running at once may need two threads
+    hedge_workers = 2 * config.concurrency if config.hedging else 0
+    return DriverRepo(timeout, limiter, requests=config.requests, selenium=config.selenium, puppeteer=config.puppeteer,
+                      lean_and_mean=config.lean_and_mean, chains=config.drivers, hedge_workers=hedge_workers,
+                      streaming=config.streaming)
@@ -1,6 +1,12 @@
+import collections
+import concurrent.futures
+import datetime
+import logging
+import queue
 import random
-import sched
-import sys
+
+from breaker import CircuitBreakerRepo
+from scheduler import LagStats, Scheduler
 
 
 random.seed()
@@ -9,50 +15,143 @@ random.seed()
 # 需要注意的是 一个config文件对应着一件商品 一个上平对应着多个网站 每一个网站对应着一个爬取任务 每个爬取任务会被无休止循环执行
 class Engine:
     def __init__(self, alerters, config, scrapers):
+        # config holds the settings shared by the whole process, while every
+        # scraper keeps the refresh_interval and max_price of its own config
         self.alerters = alerters
+        self.config = config
         self.refresh_interval = config.refresh_interval
-        self.max_price = config.max_price
-        self.scheduler = sched.scheduler()
-        #每一个s都是Scraper类的一个实例 对应着对一个网站的爬取任务
+        self.scheduler = Scheduler()
+        self.lag = LagStats()
+        self.due = dict()
+
+        # scrapes run on a bounded pool of threads, but their results are handed
+        # back to the scheduler thread so that result processing and alerting
+        # happen one at a time and in order for every scraper
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.concurrency)
+        self.domain_concurrency = config.domain_concurrency
+        self.completed = queue.Queue()
+        self.in_flight = collections.Counter()
+        self.pending = collections.defaultdict(collections.deque)
+        self.breakers = CircuitBreakerRepo(**config.circuit_breaker)
+
+        # spread the first round of scrapes over one refresh interval
+        now = self.scheduler.timefunc()
         for s in scrapers:
-            self.schedule(s)
+            self.scheduler.enter(now + random.uniform(0, self.get_config(s).refresh_interval), s)
 
     def run(self):
-        self.scheduler.run(blocking=True)
+        while self.scheduler or sum(self.in_flight.values()):
+            # dispatch every tick that is due, then wait for a scrape to finish
+            # or for the next tick to come due, whichever happens first
+            for due, s in self.scheduler.pop_due():
+                self.due[s] = due
+                self.tick(s)
+            try:
+                s, future = self.completed.get(timeout=self.scheduler.delay())
+            except queue.Empty:
+                continue
+            self.finish(s, future)
+
+    # a scraper built without a product config goes by the process-wide settings
+    def get_config(self, s):
+        return s.config if s.config is not None else self.config
+
     #该函数把一个scraper的实例s的爬取任务加入时间表
     def schedule(self, s):
-        time_delta = self.refresh_interval
+        time_delta = self.get_config(s).refresh_interval
 
         # semi-random intervals throw off some web scraping defenses
         time_delta *= random.randint(100, 120) / 100.0
 
-        #根据scheduler内部的任务数量分情况确定任务执行的时间
-        if self.scheduler.queue:
-            t = self.scheduler.queue[-1].time + time_delta
-            #表示在t时间的时候执行 Engine.tick(self, s) 这个调用 其中(self, s) 是Engine.tick的输入参数
-            self.scheduler.enterabs(t, 1, Engine.tick, (self, s))
-        else:
-            self.scheduler.enter(time_delta, 1, Engine.tick, (self, s))
+        # every scraper keeps its own cadence: the next tick is due one interval
+        # after the previous one was due, not after the last tick in the queue
+        t = self.due.pop(s, self.scheduler.timefunc()) + time_delta
+
+        # if we have fallen more than an interval behind, start over from now
+        # rather than firing a burst of overdue ticks
+        now = self.scheduler.timefunc()
+        if t < now:
+            t = now
+        self.scheduler.enter(t, s)
+
     # 每执行一次任务 然后添加下个任务
     def tick(self, s):
+        netloc = s.url.netloc
+
+        # don't waste requests on a website that keeps blocking us
+        if not self.breakers.get(netloc).allow():
+            s.logger.debug(f'{netloc} circuit breaker is open, skipping scrape')
+            return self.schedule(s)
+
+        if self.domain_concurrency is not None and self.in_flight[netloc] >= self.domain_concurrency:
+            s.logger.debug(f'{netloc} already has {self.in_flight[netloc]} scrapes in flight, waiting for a slot')
+            self.pending[netloc].append(s)
+            return
+
+        self.in_flight[netloc] += 1
+        future = self.executor.submit(self.scrape, s)
+        future.add_done_callback(lambda f: self.completed.put((s, f)))
+
+    # runs on a worker thread
+    def scrape(self, s):
+        started = self.scheduler.timefunc()
+        return started, s.scrape()
+
+    def finish(self, s, future):
+        netloc = s.url.netloc
+        self.in_flight[netloc] -= 1
+        if self.pending[netloc]:
+            self.tick(self.pending[netloc].popleft())
+
         #返回的result是ScrapeResult类的实例
-        result = s.scrape()
+        try:
+            started, result = future.result()
+            self.record_lag(started - self.due[s])
+        except Exception as e:
+            s.logger.error(f'caught exception during scrape: {e}')
+            result = None
 
         if result is None:
             s.logger.error('scrape failed')
+            self.breakers.get(netloc).record_error()
         else:
             self.process_scrape_result(s, result)
         #结束对网站的一次爬取后 把新的爬取任务加入时间轴 等待下一次爬取 所以一旦开启engine后 不会自己停止
         return self.schedule(s)
 
+    def record_lag(self, lag):
+        self.lag.record(lag)
+
+        # every five minutes, report how far behind schedule scrapes are starting
+        if datetime.datetime.now() - self.lag.since_time > datetime.timedelta(minutes=5):
+            log_level = logging.WARN if self.lag.max > self.refresh_interval else logging.INFO
+            logging.log(log_level, self.lag)
+            self.lag.reset()
+
     def process_scrape_result(self, s, result):
+        breaker = self.breakers.get(s.url.netloc)
+
         #先查看服务器返回结果是否无效
         if result.captcha:
             s.logger.warning('access denied, got a CAPTCHA')
+            breaker.record_failure()
             return
         elif result.forbidden:
             s.logger.warning('access denied, got HTTP status code 403 (forbidden)')
+            breaker.record_failure()
+            return
+        #如果碰到了需要验证的情况 需要此处补充一下验证的检测机制
+        elif not result and result.has_phrase('are you a human'):
+            s.logger.error('got "are you a human" prompt')
+            # only alert once per backoff instead of once per scrape
+            if breaker.record_failure():
+                self.alerters(subject='Something went wrong',
+                              content=f'{s.url.netloc} is asking if you are a human, backing off for {breaker.backoff:.0f} seconds: {result.url}')
             return
+
+        breaker.record_success()
+        max_price = self.get_config(s).max_price
+
         #如果result.alert_content不为空 则说明有存货
         currently_in_stock = bool(result)
         previously_in_stock = result.previously_in_stock
@@ -73,7 +172,7 @@ class Engine:
             # has the price gone down?
             elif current_price < last_price:
 
-                if self.max_price is None or current_price <= self.max_price:
+                if max_price is None or current_price <= max_price:
                     self.send_alert(s, result, f'now in stock at {current_price}!')
                 else:
                     s.logger.info(f'now in stock at {current_price}... still too expensive')
@@ -89,19 +188,11 @@ class Engine:
                 self.send_alert(s, result, 'now in stock!')
 
             # is the current price low enough?
-            elif self.max_price is None or current_price <= self.max_price:
+            elif max_price is None or current_price <= max_price:
                 self.send_alert(s, result, f'now in stock at {current_price}!')
 
             else:
                 s.logger.info(f'now in stock at {current_price}... too expensive')
-        #如果碰到了需要验证的情况 需要此处补充一下验证的检测机制
-        elif not currently_in_stock and result.has_phrase('are you a human'):
-            
-            s.logger.error('got "are you a human" prompt')
-            self.alerters(subject='Something went wrong',
-                          content=f'You need to answer this CAPTCHA and restart this script: {result.url}')
-            sys.exit(1)
-
         else:
             s.logger.info('not in stock')
 
@@ -0,0 +1,112 @@
+import asyncio
+import datetime
+import logging
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, timefunc=time.monotonic):
+        self.rate = float(rate)  # tokens per second
+        self.burst = float(burst)
+        self.timefunc = timefunc
+        self.tokens = self.burst
+        self.updated = timefunc()
+        self.lock = threading.Lock()
+
+    # takes a token and returns how long the caller has to wait before using it;
+    # tokens may go negative so that concurrent callers queue up in order
+    def reserve(self):
+        with self.lock:
+            now = self.timefunc()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RateLimitStats:
+    def __init__(self):
+        self.reset()
+
+    def record(self, wait):
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.since_time = datetime.datetime.now()
+
+    def __repr__(self):
+        mean = self.total / self.count if self.count else 0.0
+        return f'{self.count} requests, waited {self.total:.1f}s in total ({mean:.2f}s mean, {self.max:.2f}s max)'
+
+
+# one token bucket per website, shared by every driver
+class RateLimiter:
+    def __init__(self, limits):
+        self.limits = {netloc.lower(): limit for netloc, limit in limits.items() if netloc != 'default'}
+        self.default = limits.get('default')
+        self.buckets = dict()
+        self.stats = dict()
+        self.lock = threading.Lock()
+
+    # the configured domain covering the website and its limit; "newegg.com" also
+    # covers "www.newegg.com", and the most specific domain wins
+    def match(self, netloc):
+        matches = [domain for domain in self.limits if netloc == domain or netloc.endswith(f'.{domain}')]
+        if not matches:
+            return netloc, self.default  # every other website gets a bucket of its own
+        domain = max(matches, key=len)
+        return domain, self.limits[domain]
+
+    def get_limit(self, netloc):
+        return self.match(netloc)[1]
+
+    # websites covered by the same configured domain share its bucket
+    def get_bucket(self, netloc):
+        key, limit = self.match(netloc)
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(limit['rate'], limit['burst']) if limit else None
+                self.stats[key] = RateLimitStats()
+            return self.buckets[key], self.stats[key]
+
+    # takes a token for the website and returns how long the caller has to wait before using it
+    def reserve(self, netloc):
+        netloc = netloc.lower()
+        bucket, stats = self.get_bucket(netloc)
+        if bucket is None:
+            return 0.0
+
+        wait = bucket.reserve()
+        with self.lock:
+            stats.record(wait)
+
+            # every five minutes, report how long requests to this website had to wait
+            if datetime.datetime.now() - stats.since_time > datetime.timedelta(minutes=5):
+                logging.info(f'rate limit for {netloc}: {stats}')
+                stats.reset()
+
+        return wait
+
+    def acquire(self, netloc):
+        wait = self.reserve(netloc)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, netloc):
+        wait = self.reserve(netloc)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
@@ -8,7 +8,7 @@ import sys
 def parse_args():
     parser = argparse.ArgumentParser()
 
-    parser.add_argument('-c', '--config', type=argparse.FileType('r'), default='/config.yaml', help='YAML config file for web scrapers')
+    parser.add_argument('-c', '--config', nargs='+', default=['/config.yaml'], help='YAML config file(s) for web scrapers, or directories of them')
     parser.add_argument('-a', '--alerter', required=True, help="Alert system to be used", default="email", dest="alerter_type")
     parser.add_argument('-q', '--alerter-config', type=argparse.FileType('r'), help='YAML config file for alerters (required if using multiple)')
     parser.add_argument('-l', '--log', default='/log.txt', help='log file')
@@ -48,7 +48,7 @@ logging.info(f'starting {version} with args: {" ".join(sys.argv)}')
 
 
 from alerter import init_alerters
-from config import parse_config
+from config import merge_configs, parse_configs
 from driver import init_drivers
 from scraper import init_scrapers
 from hunter import hunt
@@ -57,9 +57,12 @@ from hunter import hunt
 def main():
     try:
         alerters = init_alerters(args)
-        config = parse_config(args.config)
+        # every config is hosted by the same engine and shares the same drivers
+        configs = parse_configs(args.config)
+        config = merge_configs(configs)
         drivers = init_drivers(config)
-        scrapers = init_scrapers(config, drivers)
+        scrapers = [s for c in configs for s in init_scrapers(c, drivers)]
+        logging.info(f'hunting {len(scrapers)} urls from {len(configs)} configs: {" ".join(c.name for c in configs)}')
         if args.test_alerts:
             logging.info("Sending test alert")
             alerters(subject="This is a test", content="This is only a test")
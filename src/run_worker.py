@@ -6,6 +6,13 @@ import logging
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('worker')
+    parser.add_argument('--socket', default=None, help='listen on this unix domain socket instead of tcp, @name for an abstract socket (lean_and_mean only)')
+    parser.add_argument('--processes', type=int, default=1, help='serve from this many processes on consecutive ports (lean_and_mean only)')
+    parser.add_argument('--parse-processes', type=int, default=0, help='parse pages in this many processes (lean_and_mean only)')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='handle at most this many requests at once, per process (default: no limit)')
+    parser.add_argument('--max-queued', type=int, default=0, help='let this many more requests wait for a slot, per process, before answering busy')
+    parser.add_argument('--cache-ttl', type=float, default=0, help='serve pages fetched less than this many seconds ago from a cache (lean_and_mean only)')
+    parser.add_argument('--cache-size', type=int, default=64, help='size of the page cache in megabytes (lean_and_mean only)')
     return parser.parse_args()
 
 
@@ -25,7 +32,12 @@ def main():
     #import_module只是简单地执行和import相同的步骤，但是返回生成的模块对象。你只需要将其存储在一个变量，然后像正常的模块一样使用
     #主要是解决‘你想导入一个模块，但是模块的名字在字符串里。你想对字符串调用导入命令’ 也就是包名字是变量的问题 动态导入
     pkg = importlib.import_module(f'worker.{args.worker}')
-    pkg.run()
+    if args.worker == 'lean_and_mean':
+        pkg.run(processes=args.processes, socket=args.socket, parse_processes=args.parse_processes,
+                cache_ttl=args.cache_ttl, cache_size=args.cache_size * 1024 * 1024,
+                max_in_flight=args.max_in_flight, max_queued=args.max_queued)
+    else:
+        pkg.run()
 
 
 if __name__ == '__main__':
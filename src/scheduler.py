@@ -0,0 +1,62 @@
+import datetime
+import heapq
+import itertools
+import time
+
+
+class Scheduler:
+    # jobs are kept in a heap keyed by their own due time, so every job keeps
+    # its own cadence no matter how many other jobs share the scheduler
+    def __init__(self, timefunc=time.monotonic):
+        self.timefunc = timefunc
+        self.queue = []
+        self.counter = itertools.count()  # tie breaker, keeps jobs with equal due times in FIFO order
+
+    def __len__(self):
+        return len(self.queue)
+
+    def enter(self, due, job):
+        heapq.heappush(self.queue, (due, next(self.counter), job))
+
+    def next_due(self):
+        return self.queue[0][0] if self.queue else None
+
+    def delay(self):
+        due = self.next_due()
+        return None if due is None else max(0.0, due - self.timefunc())
+
+    def pop_due(self):
+        now = self.timefunc()
+        while self.queue and self.queue[0][0] <= now:
+            due, _, job = heapq.heappop(self.queue)
+            yield due, job
+
+
+# tracks how late jobs start compared to when they were due
+class LagStats:
+    def __init__(self):
+        self.reset()
+
+    def record(self, lag):
+        lag = max(0.0, lag)
+        self.count += 1
+        self.total += lag
+        self.max = max(self.max, lag)
+
+    def get_mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.since_time = datetime.datetime.now()
+
+    def __repr__(self):
+        now = datetime.datetime.now()
+        diff = now - self.since_time
+        return (
+            f'{self.count} scrapes started '
+            f'in the last {diff.total_seconds():.0f} seconds '
+            f'(schedule lag: {self.get_mean():.2f}s mean, {self.max:.2f}s max)'
+        )
@@ -1,38 +1,86 @@
 const fs = require('fs')
 const puppeteer = require('puppeteer');
+const readline = require('readline');
 
-const url = process.argv[2];
-if (!url) {
-    throw 'missing url argument';
+const launchOptions = {
+    args: [
+        '--no-sandbox',
+        '--user-agent="Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4427.0 Safari/537.36"'
+    ],
+};
+
+async function scrape(browser, url, pngfile, timeout) {
+    const page = await browser.newPage();
+    try {
+        await page.setViewport({ width: 1920, height: 1080 });
+        const response = await page.goto(url, {waitUntil: 'domcontentloaded', timeout: timeout});
+        const content = await page.content();
+        if (pngfile) {
+            await page.screenshot({path: pngfile});
+        }
+        return {status: response ? response.status() : null, html: content};
+    } finally {
+        await page.close();
+    }
 }
 
-const htmlfile = process.argv[3];
-const pngfile = process.argv[4];
+// sidecar mode: keep one browser open and serve newline-delimited JSON requests
+// ({id, url, screenshot, timeout}) from stdin, answering each one on stdout
+async function serve() {
+    const browser = await puppeteer.launch(launchOptions);
+    browser.on('disconnected', () => process.exit(1));
+
+    const reply = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+    reply({id: 0, ready: true});
 
-(async () => {
-    const browser = await puppeteer.launch({
-        args: [
-            '--no-sandbox',
-            '--user-agent="Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4427.0 Safari/537.36"'
-        ],
+    const rl = readline.createInterface({input: process.stdin});
+    rl.on('line', async (line) => {
+        let request;
+        try {
+            request = JSON.parse(line);
+        } catch (err) {
+            console.error(`invalid request: ${err}`);
+            return;
+        }
+        try {
+            const result = await scrape(browser, request.url, request.screenshot, request.timeout || 30000);
+            reply({id: request.id, ...result});
+        } catch (err) {
+            reply({id: request.id, error: `${err}`});
+        }
     });
-    const page = await browser.newPage();
-    await page.setViewport({ width: 1920, height: 1080 });
-    await page.goto(url, {waitUntil: 'domcontentloaded'});
-    const content = await page.content();
+    rl.on('close', async () => {
+        await browser.close();
+        process.exit(0);
+    });
+}
+
+async function main() {
+    const url = process.argv[2];
+    if (!url) {
+        throw 'missing url argument';
+    }
+
+    if (url === '--serve') {
+        return serve();
+    }
+
+    const htmlfile = process.argv[3];
+    const pngfile = process.argv[4];
+
+    const browser = await puppeteer.launch(launchOptions);
+    const result = await scrape(browser, url, pngfile, 30000);
     if (htmlfile) {
-        fs.writeFile(htmlfile, content, err => {
+        fs.writeFile(htmlfile, result.html, err => {
             if (err) {
                 console.error(err)
                 return
             }
         });
     } else {
-        console.log(content);
-    }
-    if (pngfile) {
-        await page.screenshot({path: pngfile});
+        console.log(result.html);
     }
-    await page.close();
     await browser.close();
-})();
+}
+
+main();
@@ -20,4 +20,4 @@ from scraper.common import ScraperFactory
 
 
 def init_scrapers(config, drivers):
-    return [ScraperFactory.create(drivers, url) for url in config.urls]
+    return [ScraperFactory.create(drivers, url, config) for url in config.urls]
@@ -2,6 +2,10 @@ from scraper.common import ScrapeResult, Scraper, ScraperFactory
 
 #继承ScrapeResult 并实现parse函数用于特定分析亚马逊网站
 class AmazonScrapeResult(ScrapeResult):
+    parser = 'lxml'
+    # the buy box and the title, about a tenth of the page
+    regions = (('id="ppd"', 'id="feature-bullets"'),)
+
     def parse(self):
         alert_subject = 'In Stock'
         alert_content = ''
@@ -42,3 +46,8 @@ class AmazonScraper(Scraper):
     @staticmethod
     def get_result_type():
         return AmazonScrapeResult
+
+    @staticmethod
+    def get_stop_markers():
+        # the feature bullets follow the title, price and buy box
+        return (b'id="feature-bullets"',)
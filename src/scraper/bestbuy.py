@@ -5,6 +5,8 @@ from scraper.common import ScrapeResult, Scraper, ScraperFactory
 
 
 class BestBuyScrapeResult(ScrapeResult):
+    parser = 'lxml'
+
     def parse(self):
         alert_subject = 'In Stock'
         alert_content = ''
@@ -4,6 +4,8 @@ from scraper.common import ScrapeResult, Scraper, ScraperFactory
 
 
 class BHPhotoVideoScrapeResult(ScrapeResult):
+    parser = 'lxml'
+
     def parse(self):
         alert_subject = 'In Stock'
         alert_content = ''
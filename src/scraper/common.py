@@ -1,21 +1,42 @@
 import datetime
+import functools
+import hashlib
 import locale
 import logging
 import re
+import time
 
 # required for price parsing logic
 locale.setlocale(locale.LC_ALL, '')
 
 from abc import ABC, abstractmethod
-from bs4 import BeautifulSoup
+from scraper.parsers import SCRIPT_OR_STYLE, extract_regions, get_parser
+from scraper.phrases import PhraseScanner
+
+
+# phrases the hunter may ask a result about through has_phrase()
+REPORTED_PHRASES = ('are you a human',)
+# phrases the pages are scanned for up front, see ScrapeResult.has_phrase
+SCANNED_PHRASES = ('add to cart', 'add to basket') + REPORTED_PHRASES
+
 
 #ABC，Abstract Base Class（抽象基类），主要定义了基本类和最基本的抽象方法，可以为子类定义共有的API，不需要具体实现。
 class ScrapeResult(ABC):
-    def __init__(self, logger, r, last_result):
+    # the parser building self.soup (see scraper.parsers), result types switch to a
+    # faster one once tests/parser_backends shows it gives the same results on their fixtures
+    parser = 'bs4'
+    scanner = PhraseScanner(SCANNED_PHRASES)
+    # (start anchor, end anchor) pairs around the parts of the page parse() looks
+    # at, only those get parsed; the whole page is when none of them is found
+    regions = ()
+
+    # region and fingerprint are passed when the scraper already worked them out
+    def __init__(self, logger, r, last_result, region=None, fingerprint=None):
         self.alert_subject = None
         self.alert_content = None
         self.captcha = False
         self.forbidden = True if r.status_code == 403 else False
+        self.fingerprint = fingerprint
         self.logger = logger
         self.previously_in_stock = bool(last_result)
         self.price = None
@@ -23,8 +44,10 @@ class ScrapeResult(ABC):
         self.price_comma_pattern = re.compile('^.*\\,\\d{2}$')
         self.last_price = last_result.price if last_result is not None else None
         # 具体参考 https://cuiqingcai.com/1319.html
-        self.soup = BeautifulSoup(r.text, 'lxml')
-        self.content = self.soup.body.text.lower()  # lower for case-insensitive searches
+        region = region if region is not None else self.get_region(r.text)
+        self.region = region is not None
+        self.soup = get_parser(self.parser).parse(region if self.region else r.text)
+        self.text = r.text  # scanned for phrases on first use
         self.url = r.url
         #如果返回的结果中status_code的值不是 403 则调用parse函数解析 从而更新alert_subject和alert_content的值
         if not self.forbidden:
@@ -32,8 +55,59 @@ class ScrapeResult(ABC):
     #此处ScrapeResult.__bool__可以直接省略为ScrapeResult 就是根据content变量中有无内容来返回bool的值
     def __bool__(self):
         return bool(self.alert_content)
+
+    @classmethod
+    def get_region(cls, text):
+        return extract_regions(text, cls.regions) if cls.regions else None
+
+    # a digest of everything parse() depends on: the regions when they are in the
+    # page, otherwise the page minus its scripts and styles (which carry nonces and timestamps)
+    @staticmethod
+    def get_fingerprint(r, region):
+        page = region if region is not None else SCRIPT_OR_STYLE.sub('', r.text)
+        digest = hashlib.blake2b(f'{r.status_code} {r.url}\n'.encode(), digest_size=16)
+        digest.update(page.encode('utf-8', errors='replace'))
+        return digest.hexdigest()
+
+    # what the scraper keeps of this result, so that the parse tree and the page can go
+    def snapshot(self):
+        return ResultSnapshot(
+            in_stock=bool(self),
+            price=self.price,
+            last_price=self.last_price,
+            previously_in_stock=self.previously_in_stock,
+            alert_subject=self.alert_subject,
+            alert_content=self.alert_content,
+            captcha=self.captcha,
+            forbidden=self.forbidden,
+            phrases=frozenset(phrase for phrase in REPORTED_PHRASES if self.has_phrase(phrase)),
+            url=self.url,
+            fingerprint=self.fingerprint,
+        )
+
+    # the page's text, only extracted from the tree when a phrase has to be confirmed
+    @functools.cached_property
+    def content(self):
+        # the phrase may be outside of the regions
+        soup = get_parser(self.parser).parse(self.text) if self.region else self.soup
+        return soup.body.text.lower()  # lower for case-insensitive searches
+
+    # the scanned phrases which may be in the page's text, from a single pass over the raw page
+    @functools.cached_property
+    def phrase_candidates(self):
+        return self.scanner.scan(self.text)
+
+    # the scan costs less than getting the text from bs4's tree or from parsing the
+    # whole page again, but more than walking a tree lxml built for the whole page
+    @property
+    def scan_phrases(self):
+        return self.parser == 'bs4' or self.region
+
     #判断phrase似乎否存在self.content中 self.content即为网页的soup.body.text.lower()形式内容
+    # (a scanned phrase missing from the raw page can't be in the text either, so that skips the text)
     def has_phrase(self, phrase):
+        if self.scan_phrases and phrase in self.scanner.phrases and phrase not in self.phrase_candidates:
+            return False
         return phrase in self.content
     #提取价格并转化为Float格式然后赋值给self.price
     #如果有价格且成功从网页中提取出来并转换为float 则self.price不为空 其余情况全部为Non
@@ -79,9 +153,77 @@ class GenericScrapeResult(ScrapeResult):
             self.alert_subject = 'In Stock'
             self.alert_content = self.url
 
+
+# the outcome of a scrape as the hunter sees it: a few plain values instead of a
+# ScrapeResult holding the whole parse tree; immutable, replace() makes altered copies
+class ResultSnapshot:
+    __slots__ = ('in_stock', 'price', 'last_price', 'previously_in_stock', 'alert_subject', 'alert_content',
+                 'captcha', 'forbidden', 'phrases', 'url', 'fingerprint', 'timestamp', 'unchanged')
+    defaults = {'in_stock': False, 'previously_in_stock': False, 'captcha': False, 'forbidden': False,
+                'phrases': frozenset(), 'unchanged': False}
+
+    def __init__(self, **fields):
+        for name in fields:
+            if name not in ResultSnapshot.__slots__:
+                raise Exception(f'unknown result snapshot field: {name}')
+        for name in ResultSnapshot.__slots__:
+            object.__setattr__(self, name, fields.get(name, self.defaults.get(name)))
+        if self.timestamp is None:
+            object.__setattr__(self, 'timestamp', datetime.datetime.now())
+
+    def __setattr__(self, name, value):
+        raise AttributeError('result snapshots are immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('result snapshots are immutable')
+
+    def __bool__(self):
+        return self.in_stock
+
+    def __repr__(self):
+        return f'ResultSnapshot(in_stock={self.in_stock}, price={self.price}, timestamp={self.timestamp})'
+
+    def has_phrase(self, phrase):
+        if phrase not in REPORTED_PHRASES:
+            raise Exception(f'"{phrase}" is not kept in result snapshots, add it to REPORTED_PHRASES')
+        return phrase in self.phrases
+
+    def replace(self, **changes):
+        fields = {name: getattr(self, name) for name in ResultSnapshot.__slots__}
+        fields.update(changes)
+        return ResultSnapshot(**fields)
+
+    # this result again, for a page which hasn't changed since
+    def reuse(self):
+        return self.replace(previously_in_stock=bool(self), last_price=self.price,
+                            timestamp=datetime.datetime.now(), unchanged=True)
+
+
+# built from the compact result of a worker which parsed the page itself,
+# see the parse option of the lean_and_mean driver
+class ParsedScrapeResult(ResultSnapshot):
+    __slots__ = ()
+
+    def __init__(self, logger, r, last_result):
+        result = r.result
+        super().__init__(
+            in_stock=result.in_stock,
+            price=result.price if result.HasField('price') else None,
+            last_price=last_result.price if last_result is not None else None,
+            previously_in_stock=bool(last_result),
+            alert_subject=result.alert_subject if result.HasField('alert_subject') else None,
+            alert_content=result.alert_content if result.HasField('alert_content') else None,
+            captcha=result.captcha,
+            forbidden=result.forbidden,
+            phrases=frozenset(result.phrases),
+            url=r.url,
+        )  # no fingerprint, the page stayed in the worker
+
+
 #监测爬虫的表现水平
 class ScraperStats:
     def __init__(self):
+        self.fingerprint = None  # of the last page, see ScrapeResult.get_fingerprint
         self.reset()
 
     def get_failure_rate(self):
@@ -94,31 +236,43 @@ class ScraperStats:
         total = self.num_successful + self.num_failed
         return total if total else 1  # to prevent divide by zero
 
+    def get_unchanged_rate(self):
+        return 100.0 * self.num_unchanged / (self.num_successful if self.num_successful else 1)
+
     def reset(self):
         self.num_successful = 0
         self.num_failed = 0
+        self.num_unchanged = 0  # pages with the same fingerprint as the last one, not parsed again
         self.since_time = datetime.datetime.now()
 
     def __repr__(self):
         now = datetime.datetime.now()
         diff = now - self.since_time
         success_rate = self.get_success_rate()
+        unchanged = ''
+        if self.fingerprint is not None:
+            unchanged = f', {self.get_unchanged_rate():.0f}% unchanged pages (fingerprint {self.fingerprint[:12]})'
         return (
             f'{self.num_successful} successful scrapes '
             f'in the last {diff.total_seconds():.0f} seconds '
-            f'({success_rate:.0f}% success rate)'
+            f'({success_rate:.0f}% success rate{unchanged})'
         )
 
 #用于爬取网站的类
 class Scraper(ABC):
     #注意此处的url是后面定义的URL类的实例 不是单纯的链接
-    def __init__(self, drivers, url):
+    def __init__(self, drivers, url, config=None):
         #此处选择在drivers中的self.get_driver_type()属性 从而决定哪一个driver
-        self.driver = getattr(drivers, self.get_driver_type())
+        # (unless the config gives this website its own chain of drivers)
+        self.drivers = drivers
+        self.chain = drivers.get_chain(url.netloc, self.get_driver_type())
+        self.driver = getattr(drivers, self.chain.names[0])
+        url.stop_markers = drivers.get_stop_markers(url.netloc, self.get_stop_markers())
         self.filename = drivers.data_dir / f'{url.nickname}.html'
         self.logger = logging.getLogger(url.nickname)
         self.stats = ScraperStats()
         self.url = url
+        self.config = config  # the product config this url came from (refresh_interval, max_price)
         self.last_result = None
         self.logger.info(f'scraper initialized for {self.url}')
 
@@ -137,9 +291,25 @@ class Scraper(ABC):
     def get_result_type():
         pass
 
+    # bytes that only come after everything the result type looks at, so that a
+    # streaming driver can stop reading the page there
+    @staticmethod
+    def get_stop_markers():
+        return ()
+
     def scrape(self):
         #调用scrape_impl进行网页爬取
         r = self.scrape_impl()
+        self.record_scrape(r)
+        return r
+
+    # same as scrape, for callers running many scrapes on one event loop
+    async def scrape_async(self):
+        r = await self.scrape_impl_async()
+        self.record_scrape(r)
+        return r
+
+    def record_scrape(self, r):
         #如果成功获取网页内容 则算作成功爬取一次 否则记作失败
         if r is not None:
             self.stats.num_successful += 1
@@ -152,27 +322,79 @@ class Scraper(ABC):
             self.logger.log(log_level, self.stats)
             self.stats.reset()
 
-        return r
     #爬取网页内容 并根据result_type 创建ScrapeResult实例 可以是GenericScrapeResult 也可以是具体网站的结果类型 如AmazonScrapeResult
     def scrape_impl(self):
         try:
             self.logger.debug('starting new scrape')
-            #打开网页链接 并保存到data文件夹中
-            r = self.driver.get(self.url)
-            if self.get_driver_type() != 'puppeteer':
-                #注意此处要规定编码方式 默认会报‘gbk’ codec can’t encode characte错误
-                with self.filename.open('w',encoding='utf-8') as f:
-                    f.write(r.text)
-            result_type = self.get_result_type()
-            #根据返回的类型创建结果实例
-            this_result = result_type(self.logger, r, self.last_result)
-            self.last_result = this_result
-            return this_result
+            fetched = self.chain.run(self.url.netloc, self.fetch, self.is_usable)
+            return self.accept(fetched)
+        except Exception as e:
+            self.logger.error(f'caught exception during request: {e}')
+            self.stats.num_failed += 1
 
+    async def scrape_impl_async(self):
+        try:
+            self.logger.debug('starting new scrape')
+            fetched = await self.chain.run_async(self.url.netloc, self.fetch_async, self.is_usable)
+            return self.accept(fetched)
         except Exception as e:
             self.logger.error(f'caught exception during request: {e}')
             self.stats.num_failed += 1
 
+    # fetches and parses the page with one driver of the chain, returns (response, result)
+    def fetch(self, name):
+        start = time.monotonic()
+        try:
+            #打开网页链接
+            r = getattr(self.drivers, name).get(self.url)
+            return r, self.make_result(r, name, start)
+        except Exception as e:
+            self.logger.warning(f'{name} driver failed: {e}')
+
+    async def fetch_async(self, name):
+        start = time.monotonic()
+        try:
+            r = await getattr(self.drivers, name).get_async(self.url)
+            return r, self.make_result(r, name, start)
+        except Exception as e:
+            self.logger.warning(f'{name} driver failed: {e}')
+
+    def make_result(self, r, name, start):
+        self.drivers.latency.record((self.url.netloc, name), time.monotonic() - start)
+        # the worker already parsed the page, only its result came back
+        if r.result is not None:
+            return ParsedScrapeResult(self.logger, r, self.last_result)
+        result_type = self.get_result_type()
+        # the page hasn't changed since the last scrape, no need to parse it again
+        region = result_type.get_region(r.text)
+        fingerprint = result_type.get_fingerprint(r, region)
+        last_result = self.last_result
+        if last_result is not None and last_result.fingerprint == fingerprint:
+            return last_result.reuse()
+        #根据返回的类型创建结果实例
+        result = result_type(self.logger, r, last_result, region=region, fingerprint=fingerprint)
+        return result.snapshot()  # the parse tree goes away with the result
+
+    @staticmethod
+    def is_usable(fetched):
+        return fetched is not None and not fetched[1].captcha and not fetched[1].forbidden
+
+    # keeps the response that won (and saves it to the data folder)
+    def accept(self, fetched):
+        if fetched is None:
+            raise Exception(f'every driver failed: {self.chain}')
+        r, this_result = fetched
+        if r.result is None:
+            #注意此处要规定编码方式 默认会报‘gbk’ codec can’t encode characte错误
+            with self.filename.open('w',encoding='utf-8') as f:
+                f.write(r.text)
+        self.last_result = this_result
+        if this_result.fingerprint is not None:
+            self.stats.fingerprint = this_result.fingerprint
+        if this_result.unchanged:
+            self.stats.num_unchanged += 1
+        return this_result
+
 
 class GenericScraper(Scraper):
     @staticmethod
@@ -192,13 +414,19 @@ class ScraperFactory:
     registry = dict()
 
     @classmethod
-    def create(cls, drivers, url):
+    def create(cls, drivers, url, config=None):
+        scraper_type = cls.get_scraper_type(url.netloc)
+        if scraper_type is GenericScraper:
+            logging.warning(f'warning: using generic scraper for url: {url}')
+        return scraper_type(drivers, url, config)
+
+    @classmethod
+    def get_scraper_type(cls, netloc):
         #对于字典中每一个注册的domain scraper 对，如果在链接的netloc值中找到domain信息 则说明该url有特定模板 不用通用模板
         for domain, scraper_type in cls.registry.items():
-            if domain in url.netloc:
-                return scraper_type(drivers, url)
-        logging.warning(f'warning: using generic scraper for url: {url}')
-        return GenericScraper(drivers, url)
+            if domain in netloc:
+                return scraper_type
+        return GenericScraper
     # 此处获取所有的已经有具体模板的网站
     @classmethod
     def register(cls, scraper_type):
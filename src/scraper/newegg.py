@@ -2,6 +2,10 @@ from scraper.common import ScrapeResult, Scraper, ScraperFactory
 
 
 class NeweggScrapeResult(ScrapeResult):
+    parser = 'lxml'
+    # the buy box and the title of single products, or of combos
+    regions = (('class="product-buy-box"', 'id="product-details"'), ('class="grpDesc', 'id="scrollFullInfo"'))
+
     def parse(self):
         alert_subject = 'In Stock'
         alert_content = ''
@@ -82,3 +86,8 @@ class NeweggScraper(Scraper):
     @staticmethod
     def get_result_type():
         return NeweggScrapeResult
+
+    @staticmethod
+    def get_stop_markers():
+        # the product details tabs follow the buy box (of single products and of combos)
+        return (b'id="product-details"', b'id="scrollFullInfo"')
@@ -0,0 +1,340 @@
+import logging
+import re
+import threading
+
+from abc import ABC, abstractmethod
+from bs4 import BeautifulSoup
+from lxml import etree
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+# tags whose contents bs4 leaves out of the text of the tags around them
+SKIPPED_TAGS = {'script', 'style', 'template'}
+# tags inside which bs4 keeps whitespace-only strings as they are
+PRESERVE_WHITESPACE_TAGS = {'pre', 'textarea'}
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+# like bs4, which turns every whitespace-only string into a single newline or space
+def add_text(parts, text, preserve):
+    if not preserve and not text.strip(ASCII_SPACES):
+        text = '\n' if '\n' in text else ' '
+    parts.append(text)
+
+
+# turns a page into a tree offering the small part of the bs4 api that the
+# result types use: body, find(name, class_=, id=), select_one(css), text,
+# get_text(), attrs and tag['attr']
+class Parser(ABC):
+    name = None
+
+    @abstractmethod
+    def parse(self, text):
+        pass
+
+
+class Bs4Parser(Parser):
+    name = 'bs4'
+
+    def parse(self, text):
+        return BeautifulSoup(text, 'lxml')
+
+
+# bs4 matches a class either against any of the element's classes or against the whole attribute
+def match_class(class_, value):
+    if class_ is None:
+        return True
+    if value is None:
+        return False
+    classes = value.split()
+    if isinstance(class_, re.Pattern):
+        return any(class_.search(c) for c in classes) or bool(class_.search(value))
+    return class_ in classes or class_ == ' '.join(classes)
+
+
+# lxml: the same libxml2 parser bs4 uses, without building a python object per
+# node; lookups are compiled to xpath once per thread and reused for every page
+
+
+# the css subset the result types use: type, #id, .class, [attr] and [attr="value"]
+# compounds joined by descendant or child (>) combinators, with backslash escapes
+CSS_TOKEN = re.compile(r'''
+    (?P<combinator>\s*>\s*|\s+)
+  | (?P<type>(?:[\w-]|\\.)+|\*)
+  | \#(?P<id>(?:[\w-]|\\.)+)
+  | \.(?P<class>(?:[\w-]|\\.)+)
+  | \[\s*(?P<attr>[\w-]+)\s*(?:=\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[\w-]+))\s*)?\]
+''', re.VERBOSE)
+CSS_ESCAPE = re.compile(r'\\(.)')
+
+
+def unescape(identifier):
+    return CSS_ESCAPE.sub(r'\1', identifier)
+
+
+def xpath_literal(value):
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    raise Exception(f'unsupported quotes in selector value: {value}')
+
+
+def xpath_has_class(value):
+    return f"contains(concat(' ', normalize-space(@class), ' '), {xpath_literal(f' {value} ')})"
+
+
+def css_to_xpath(selector):
+    selector = selector.strip()
+    steps, axis, node, predicates = [], './/', None, []
+
+    def close_step():
+        if node is None and not predicates:
+            raise Exception(f'unsupported css selector: {selector}')
+        steps.append(axis + (node or '*') + ''.join(f'[{p}]' for p in predicates))
+
+    pos = 0
+    while pos < len(selector):
+        m = CSS_TOKEN.match(selector, pos)
+        if m is None:
+            raise Exception(f'unsupported css selector: {selector}')
+        pos = m.end()
+        if m.group('combinator') is not None:
+            close_step()
+            axis = '/' if '>' in m.group('combinator') else '//'
+            node, predicates = None, []
+        elif m.group('type') is not None:
+            node = unescape(m.group('type')).lower()
+        elif m.group('id') is not None:
+            predicates.append(f"@id={xpath_literal(unescape(m.group('id')))}")
+        elif m.group('class') is not None:
+            predicates.append(xpath_has_class(unescape(m.group('class'))))
+        else:
+            value = next((v for v in m.group('dq', 'sq', 'bare') if v is not None), None)
+            predicates.append(f'@{m.group("attr")}' if value is None else f'@{m.group("attr")}={xpath_literal(value)}')
+    close_step()
+    return f"({''.join(steps)})[1]"
+
+
+# a regex class_ can't be expressed in xpath 1.0, those candidates are filtered in python
+def find_to_xpath(name, class_, id):
+    predicates = []
+    if id is not None:
+        predicates.append(f'@id={xpath_literal(id)}')
+    if isinstance(class_, str):
+        predicates.append(f'({xpath_has_class(class_)} or normalize-space(@class)={xpath_literal(class_)})')
+    elif class_ is not None:
+        predicates.append('@class')  # a regex, matched in python
+    xpath = f".//{name or '*'}" + ''.join(f'[{p}]' for p in predicates)
+    return xpath if isinstance(class_, re.Pattern) else f'({xpath})[1]'
+
+
+class LxmlTag:
+    xpaths = threading.local()  # xpath objects must not be shared between threads
+
+    def __init__(self, element):
+        self.element = element
+
+    def __str__(self):
+        return etree.tostring(self.element, encoding='unicode', method='html', with_tail=False)
+
+    @classmethod
+    def compile(cls, key, translate):
+        compiled = getattr(cls.xpaths, 'compiled', None)
+        if compiled is None:
+            compiled = cls.xpaths.compiled = dict()
+        if key not in compiled:
+            compiled[key] = etree.XPath(translate())
+        return compiled[key]
+
+    @classmethod
+    def wrap(cls, elements):
+        return cls(elements[0]) if elements else None
+
+    def find(self, name=None, class_=None, id=None):
+        xpath = self.compile(('find', name, class_, id), lambda: find_to_xpath(name, class_, id))
+        if not isinstance(class_, re.Pattern):
+            return self.wrap(xpath(self.element))
+        for element in xpath(self.element):
+            if match_class(class_, element.get('class')):
+                return LxmlTag(element)
+        return None
+
+    def select_one(self, selector):
+        return self.wrap(self.compile(('select', selector), lambda: css_to_xpath(selector))(self.element))
+
+    @property
+    def text(self):
+        parts = []
+        preserve = any(e.tag in PRESERVE_WHITESPACE_TAGS for e in self.element.iterancestors())
+        self.collect_text(self.element, parts, preserve)
+        return ''.join(parts)
+
+    def get_text(self):
+        return self.text
+
+    @staticmethod
+    def collect_text(element, parts, preserve):
+        preserve = preserve or element.tag in PRESERVE_WHITESPACE_TAGS
+        if element.text:
+            add_text(parts, element.text, preserve)
+        for child in element:
+            # comments and processing instructions have a function as tag, only their tail is text
+            if isinstance(child.tag, str) and child.tag not in SKIPPED_TAGS:
+                LxmlTag.collect_text(child, parts, preserve)
+            if child.tail:
+                add_text(parts, child.tail, preserve)
+
+    @property
+    def attrs(self):
+        attrs = dict(self.element.attrib)
+        if 'class' in attrs:
+            attrs['class'] = attrs['class'].split()
+        return attrs
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+
+class LxmlDocument:
+    def __init__(self, root):
+        self.root = root
+
+    @property
+    def body(self):
+        body = self.root.find('body') if self.root is not None else None
+        return LxmlTag(body) if body is not None else None
+
+
+class LxmlParser(Parser):
+    name = 'lxml'
+
+    def __init__(self):
+        self.parsers = threading.local()
+
+    def parse(self, text):
+        parser = getattr(self.parsers, 'parser', None)
+        if parser is None:
+            parser = self.parsers.parser = etree.HTMLParser(encoding='utf-8')
+        # bytes, since lxml refuses str pages which declare their encoding
+        return LxmlDocument(etree.fromstring(text.encode('utf-8', errors='replace'), parser))
+
+
+# selectolax: lexbor's html5 parser, optional (pip install selectolax)
+
+
+class SelectolaxTag:
+    def __init__(self, node):
+        self.node = node
+
+    def __str__(self):
+        return self.node.html
+
+    def find(self, name=None, class_=None, id=None):
+        selector = name or '*'
+        if id is not None:
+            selector += f'[id={xpath_literal(id)}]'
+        for node in self.node.css(selector):
+            if match_class(class_, node.attributes.get('class')):
+                return SelectolaxTag(node)
+        return None
+
+    def select_one(self, selector):
+        node = self.node.css_first(selector)
+        return SelectolaxTag(node) if node is not None else None
+
+    @property
+    def text(self):
+        parts, preserve, parent = [], False, self.node.parent
+        while parent is not None and not preserve:
+            preserve, parent = parent.tag in PRESERVE_WHITESPACE_TAGS, parent.parent
+        self.collect_text(self.node, parts, preserve)
+        return ''.join(parts)
+
+    def get_text(self):
+        return self.text
+
+    @staticmethod
+    def collect_text(node, parts, preserve):
+        preserve = preserve or node.tag in PRESERVE_WHITESPACE_TAGS
+        for child in node.iter(include_text=True):
+            # comments and the like have tags starting with '-'
+            if child.tag == '-text':
+                add_text(parts, child.text_content, preserve)
+            elif not child.tag.startswith('-') and child.tag not in SKIPPED_TAGS:
+                SelectolaxTag.collect_text(child, parts, preserve)
+
+    @property
+    def attrs(self):
+        attrs = {key: value if value is not None else '' for key, value in self.node.attributes.items()}
+        if 'class' in attrs:
+            attrs['class'] = attrs['class'].split()
+        return attrs
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+
+class SelectolaxDocument:
+    def __init__(self, tree):
+        self.tree = tree
+
+    @property
+    def body(self):
+        return SelectolaxTag(self.tree.body) if self.tree.body is not None else None
+
+
+class SelectolaxParser(Parser):
+    name = 'selectolax'
+
+    def parse(self, text):
+        return SelectolaxDocument(LexborHTMLParser(text))
+
+
+PARSERS = {parser_type.name: parser_type for parser_type in [Bs4Parser, LxmlParser, SelectolaxParser]}
+instances = dict()
+instances_lock = threading.Lock()
+
+
+def get_parser(name):
+    if name not in PARSERS:
+        raise Exception(f'unknown parser: {name}, must be one of {", ".join(PARSERS)}')
+    if name == 'selectolax' and LexborHTMLParser is None:
+        logging.warning('the selectolax parser requires the selectolax package (pip install selectolax), falling back to bs4')
+        name = 'bs4'
+    with instances_lock:
+        if name not in instances:
+            instances[name] = PARSERS[name]()
+        return instances[name]
+
+
+SCRIPT_OR_STYLE = re.compile(r'<(script|style)(?=[\s/>])[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+
+
+# cuts the parts a result type looks at out of a page: every region goes from
+# the tag holding its start anchor up to the tag holding its end anchor, minus
+# the scripts and styles in between; returns None when no region is in the page
+def extract_regions(text, regions):
+    parts = []
+    for start_anchor, end_anchor in regions:
+        start = text.find(start_anchor)
+        end = text.find(end_anchor, start) if start != -1 else -1
+        if end == -1:
+            continue
+        start = max(text.rfind('<', 0, start), 0)
+        if not end_anchor.startswith('<'):
+            end = text.rfind('<', start, end)
+        parts.append(SCRIPT_OR_STYLE.sub('', text[start:end]))
+    if not parts:
+        return None
+    return '<html><body>' + ''.join(parts) + '</body></html>'
@@ -0,0 +1,51 @@
+import re
+
+
+# looks for several phrases at once in the raw page, case-insensitively, as a
+# prefilter for searching the page's text: a phrase it doesn't find can't be in
+# the text (the opposite doesn't hold, so hits still have to be confirmed against the text)
+#
+# the page is reduced to its text the way the parser sees it: comments, scripts,
+# styles and tags go, textarea and title keep their contents as they are, and
+# every entity becomes a wildcard standing for any one character (or none);
+# whitespace is dropped from both the page and the phrases, so that markup
+# between or inside the words of a phrase doesn't get in the way
+class PhraseScanner:
+    # a quote only starts a value right after an =, and a > in a quoted value doesn't end the tag
+    tag = r'''[^>=]*(?:=\s*(?:"[^"]*"|'[^']*'|)[^>=]*)*>'''
+    markup = re.compile(rf'''
+        <!--.*?-->
+      | <(?P<raw>script|style)(?=[\s/>]){tag}.*?</(?P=raw)\s*>
+      | <(?P<rcdata>textarea|title)(?=[\s/>]){tag}(?P<contents>.*?)</(?P=rcdata)\s*>
+      | <[a-z/!?]{tag}
+    ''', re.VERBOSE | re.DOTALL)
+    entity = re.compile(r'&#?\w+;?')
+    whitespace = re.compile(r'\s+')
+    wildcard = '\0'
+    # markup whose text the scanner doesn't model, pages with it are left to the text search
+    unsupported = ('<template', '<xmp', '<plaintext', wildcard)
+
+    def __init__(self, phrases):
+        self.phrases = tuple(phrase.lower() for phrase in phrases)
+        self.words = tuple(''.join(phrase.split()) for phrase in self.phrases)
+        self.patterns = [re.compile(f'{self.wildcard}*'.join(f'[{re.escape(c)}{self.wildcard}]' for c in word)) for word in self.words]
+
+    # the page's text without whitespace, give or take: it may have more in it than the parser's text, never less
+    def get_text(self, page):
+        text = self.markup.sub(r'\g<contents>', page)  # the contents group is empty for everything but textarea and title
+        text = self.entity.sub(self.wildcard, text)
+        return self.whitespace.sub('', text)
+
+    # returns the phrases which may be in the page's text; the page is the decoded
+    # text the parser gets, lowercased like the text is before searching it
+    def scan(self, page):
+        page = page.lower()
+        if any(marker in page for marker in self.unsupported):
+            return set(self.phrases)
+        text = self.get_text(page)
+        found = set()
+        for phrase, word, pattern in zip(self.phrases, self.words, self.patterns):
+            # most pages with the phrase have it verbatim, the wildcards only need a look when they don't
+            if word in text or (self.wildcard in text and pattern.search(text)):
+                found.add(phrase)
+        return found
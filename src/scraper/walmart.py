@@ -2,6 +2,8 @@ from scraper.common import ScrapeResult, Scraper, ScraperFactory
 
 
 class WalmartScrapeResult(ScrapeResult):
+    parser = 'lxml'
+
     def parse(self):
         alert_subject = 'In Stock'
         alert_content = ''
@@ -0,0 +1,34 @@
+CHUNK_SIZE = 16 * 1024
+
+
+# collects a page chunk by chunk and tells the caller when it has read enough:
+# once one of the stop markers (bytes that come after everything the scraper
+# looks at) went by, or once max_bytes were read
+class StreamReader:
+    def __init__(self, stop_markers=(), max_bytes=None):
+        self.stop_markers = [m.encode() if isinstance(m, str) else m for m in stop_markers]
+        self.max_bytes = max_bytes
+        self.chunks = []
+        self.size = 0
+        self.tail = b''  # the end of the previous chunk, a marker may straddle two chunks
+        self.overlap = max((len(m) for m in self.stop_markers), default=1) - 1
+        self.truncated = False
+
+    # returns True once the rest of the page can be skipped
+    def feed(self, chunk):
+        # a page of exactly max_bytes is whole, it's only truncated once bytes are dropped
+        if self.max_bytes is not None and self.size + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.size]
+            self.truncated = True
+
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        window = self.tail + chunk
+        if any(marker in window for marker in self.stop_markers):
+            self.truncated = True
+        self.tail = window[-self.overlap:] if self.overlap else b''
+        return self.truncated
+
+    @property
+    def body(self):
+        return b''.join(self.chunks)
@@ -2,8 +2,37 @@ import worker.lean_and_mean  # noqa: F401
 
 from worker.client import Client
 from worker.registry import EndpointRegistry
+from worker.spawn import ProcessWorker, SharedWorker, ThreadWorker, wait_until_ready
 
 
-def init_client(endpoint):
+# socket connects to the worker through a unix domain socket instead of tcp
+def init_client(endpoint, socket=None, **kwargs):
     endpoint = EndpointRegistry.get(endpoint)
-    return Client(endpoint)
+    if socket:
+        endpoint = endpoint.with_path(socket)
+    return Client(endpoint, **kwargs)
+
+
+# starts the worker for the hunter instead of relying on a separately started
+# run_worker.py: on a thread of the hunter, as a child process, or as a child
+# process shared with the other hunters on this host; returns once it is ready
+def init_worker(endpoint, spawn, socket=None, processes=1, timeout=30):
+    server_type = EndpointRegistry.get_server(endpoint)
+    endpoint = EndpointRegistry.get(endpoint)
+    if socket:
+        endpoint = endpoint.with_path(socket)
+
+    if spawn == 'thread':
+        if processes > 1:
+            raise Exception('a worker spawned on a thread runs a single process')
+        spawned = ThreadWorker(server_type, endpoint)
+    elif spawn == 'process':
+        spawned = ProcessWorker(endpoint, processes)
+    elif spawn == 'shared':
+        spawned = SharedWorker(endpoint, processes)
+    else:
+        raise Exception(f'unknown worker spawn mode: {spawn}')
+
+    spawned.start()
+    wait_until_ready(endpoint, processes, timeout)
+    return spawned
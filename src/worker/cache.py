@@ -0,0 +1,73 @@
+import collections
+import datetime
+import time
+import urllib.parse
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+# requests for the same page should share fetches and cache entries even when
+# their urls are spelled slightly differently
+def normalize_url(url):
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname or ''
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{parts.port}'
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+# keeps fetched pages for a short while, evicting the least recently used ones
+# once the bodies take up more than max_bytes
+class PageCache:
+    def __init__(self, ttl, max_bytes, timefunc=time.monotonic):
+        self.ttl = ttl  # seconds
+        self.max_bytes = max_bytes
+        self.timefunc = timefunc
+        self.entries = collections.OrderedDict()
+        self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, page = entry
+        if expires <= self.timefunc():
+            self.remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return page
+
+    def put(self, key, page):
+        if len(page.body) > self.max_bytes:
+            return
+        self.remove(key)
+        self.entries[key] = (self.timefunc() + self.ttl, page)
+        self.size += len(page.body)
+        while self.size > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1].body)
+
+
+# how many requests were answered without a fetch of their own
+class FetchStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.fetches = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.since_time = datetime.datetime.now()
+
+    def __repr__(self):
+        return f'{self.fetches} upstream fetches, {self.coalesced} coalesced requests, {self.cache_hits} cache hits'
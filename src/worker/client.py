@@ -1,44 +1,220 @@
 import asyncio
+import itertools
 import logging
+import random
+import threading
 
 import worker.worker_pb2 as spec
 
+from worker.protocol import PROTOCOL_VERSION, decompress, encode_frame, get_supported_compressions, read_frame
 
-class Client:
+
+# one long-lived connection to a worker process, requests are multiplexed over
+# it and responses are matched to requests by id
+class Connection:
     def __init__(self, endpoint):
-        self._endpoint = endpoint
-        self._request = spec.Request()
+        self.endpoint = endpoint
+        self.pending = dict()
+        self.reader = None
+        self.writer = None
+        self.connect_lock = None
+        self.read_task = None
+        self.alive = True
 
-    def decode_response(self, data) -> spec.Response:
-        response = spec.Response()
-        response.ParseFromString(data)
-        return response
+    def __repr__(self):
+        return repr(self.endpoint)
+
+    async def connect(self):
+        if self.connect_lock is None:
+            self.connect_lock = asyncio.Lock()
+        async with self.connect_lock:
+            if self.writer is None or self.writer.is_closing():
+                #此处建立客户端与服务器的连接
+                logging.debug(f'connecting to {self}')
+                try:
+                    reader, writer = await self.endpoint.open_connection()
+                except OSError as e:
+                    self.set_alive(False)
+                    raise ConnectionError(f'unable to connect to {self}: {e}')
+                self.reader, self.writer = reader, writer
+                self.set_alive(True)
+                self.read_task = asyncio.create_task(self.read_responses(reader, writer))
+            return self.writer
+
+    def set_alive(self, alive):
+        if alive != self.alive:
+            logging.log(logging.INFO if alive else logging.WARNING, f'worker {self} is {"back up" if alive else "down"}')
+        self.alive = alive
+
+    async def read_responses(self, reader, writer):
+        try:
+            while True:
+                data = await read_frame(reader)
+                if data is None:
+                    break
+                response = spec.Response()
+                response.ParseFromString(data)
+                future = self.pending.pop(response.id, None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            logging.warning(f'lost connection to {self}: {e}')
 
-    def encode_request(self, request_id: int, url: str, timeout: int) -> str:
-        self._request.Clear()
-        self._request.id = request_id
-        self._request.url = url
-        self._request.timeout = timeout
-        return self._request.SerializeToString()
-
-    async def get_impl(self, request_id: int, url: str, timeout: int) -> spec.Response:
-        #此处建立客户端与服务器的连接
-        reader, writer = await asyncio.open_connection(self._endpoint.addr, self._endpoint.port)
-        #先序列化请求信息 写入请求
-        serialized_request = self.encode_request(request_id, url, timeout)
-        writer.write(serialized_request)
-        writer.write_eof()
-        await writer.drain()
-        #然后等待服务器发回反馈
-        response = self.decode_response(await reader.read())
-        logging.debug(f'got response with id {response.id}, status_code: {response.status_code}, data: <{len(response.data)} bytes>')
+        # fail whatever was still waiting on this connection, the health check reconnects
+        if self.writer is writer:
+            self.reader, self.writer = None, None
+            self.set_alive(False)
         writer.close()
-        await writer.wait_closed()
-        #返回服务器的结果
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f'connection to {self} closed'))
+
+    async def close(self):
+        if self.read_task is not None:
+            self.read_task.cancel()
+            await asyncio.gather(self.read_task, return_exceptions=True)
+            self.read_task = None
+        if self.writer is not None:
+            self.writer.close()
+            self.reader, self.writer = None, None
+
+    async def request(self, request_id, data, timeout):
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            writer = await self.connect()
+            writer.write(encode_frame(data))
+            await writer.drain()
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+
+# talks to every process of a worker (see Endpoint.get_instance) and sends every
+# request to the live worker with the fewest requests in flight
+class Client:
+    health_check_interval = 5  # seconds
+    busy_retries = 3
+    busy_backoff = 0.5  # seconds, doubled after every busy response
+
+    def __init__(self, endpoint, compression=None, processes=1):
+        self._endpoint = endpoint
+        # the worker may compress responses with any of these, loopback traffic is cheap so this is off by default
+        self._accept_compression = []
+        if compression is not None:
+            accepted = spec.Compression.Value(compression.upper())
+            if accepted not in get_supported_compressions():
+                raise Exception(f'{compression} compression is not supported, is the zstandard package installed?')
+            self._accept_compression = [accepted]
+        self._request_ids = itertools.count(1)
+        self.connections = [Connection(endpoint.get_instance(i)) for i in range(processes)]
+        self._health_check = None
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+
+    def encode_request(self, request_id: int, url: str, timeout: int, parse: bool = False, **stream) -> str:
+        # a fresh message per call, since the hunter may encode requests from several threads
+        request = spec.Request()
+        request.id = request_id
+        request.url = url
+        request.timeout = timeout
+        request.version = PROTOCOL_VERSION
+        request.accept_compression.extend(self._accept_compression)
+        request.parse = parse
+        request.stop_markers.extend(stream.get('stop_markers', ()))
+        if stream.get('max_bytes'):
+            request.max_bytes = stream['max_bytes']
+        return request.SerializeToString()
+
+    # the connections live on their own event loop so that they can be shared by
+    # every thread (and every other event loop) in the hunter
+    def get_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name=f'{self._endpoint.name}-client', daemon=True)
+                self._loop_thread.start()
+            return self._loop
+
+    async def close_impl(self):
+        if self._health_check is not None:
+            self._health_check.cancel()
+            await asyncio.gather(self._health_check, return_exceptions=True)
+            self._health_check = None
+        for connection in self.connections:
+            await connection.close()
+
+    # closes the connections and stops the client's event loop, the client can be used again afterwards
+    def close(self):
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop, self._loop_thread = None, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.close_impl(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        for connection in self.connections:
+            connection.connect_lock = None  # bound to the old loop
+
+    def next_request_id(self) -> int:
+        return next(self._request_ids) % 0xffffffff + 1  # ids are uint32 on the wire
+
+    def pick_connection(self) -> Connection:
+        # if every worker looks dead, try them all anyway rather than failing outright
+        candidates = [c for c in self.connections if c.alive] or self.connections
+        return min(candidates, key=lambda c: len(c.pending))
+
+    # reconnects to dead workers in the background so that they rejoin the pool
+    async def check_health(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for connection in self.connections:
+                if connection.writer is None or connection.writer.is_closing():
+                    try:
+                        await connection.connect()
+                    except ConnectionError as e:
+                        logging.debug(f'health check failed: {e}')
+
+    async def get_impl(self, url: str, timeout: int, parse: bool = False, **stream) -> spec.Response:
+        if self._health_check is None and len(self.connections) > 1:
+            self._health_check = asyncio.create_task(self.check_health())
+
+        request_id = self.next_request_id()
+        connection = self.pick_connection()
+        #先序列化请求信息 写入请求 然后等待服务器发回反馈
+        response = await connection.request(request_id, self.encode_request(request_id, url, timeout, parse, **stream), timeout + 5)
+
+        logging.debug(f'got response with id {response.id} from {connection}, status_code: {response.status_code}, body: <{len(response.body)} bytes>')
+        if response.compression != spec.NONE:
+            response.body = decompress(response.body, response.compression)
+            response.compression = spec.NONE
         return response
 
-    async def get_async(self, request_id: int, url: str, timeout: int) -> spec.Response:
-        return self.get_impl(request_id, url, timeout)
+    async def get_with_reconnect(self, url: str, timeout: int, parse: bool = False, **stream) -> spec.Response:
+        # a worker which died is marked as down, so the retry goes to another one
+        try:
+            return await self.get_impl(url, timeout, parse, **stream)
+        except ConnectionError as e:
+            logging.debug(f'retrying request for {url} after connection error: {e}')
+            return await self.get_impl(url, timeout, parse, **stream)
+
+    async def get_with_retry(self, url: str, timeout: int, parse: bool = False, **stream) -> spec.Response:
+        for attempt in range(self.busy_retries + 1):
+            response = await self.get_with_reconnect(url, timeout, parse, **stream)
+            if not response.busy or attempt == self.busy_retries:
+                return response
+            # random delays keep hunters from coming back all at once
+            delay = random.uniform(0, self.busy_backoff * 2 ** attempt)
+            logging.debug(f'worker is busy, retrying request for {url} in {delay:.2f} seconds')
+            await asyncio.sleep(delay)
+
+    async def get_async(self, url: str, timeout: int, parse: bool = False, **stream) -> spec.Response:
+        future = asyncio.run_coroutine_threadsafe(self.get_with_retry(url, timeout, parse, **stream), self.get_loop())
+        return await asyncio.wrap_future(future)
 
-    def get(self, request_id: int, url: str, timeout: int) -> spec.Response:
-        return asyncio.run(self.get_impl(request_id, url, timeout))
+    def get(self, url: str, timeout: int, parse: bool = False, **stream) -> spec.Response:
+        future = asyncio.run_coroutine_threadsafe(self.get_with_retry(url, timeout, parse, **stream), self.get_loop())
+        return future.result()
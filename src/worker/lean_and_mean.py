@@ -1,19 +1,42 @@
-import logging
 # aiohttp是一个异步的 HTTP 客户端\服务端框架，基于 asyncio 的异步模块。可用于实现异步爬虫，更快于 requests 的同步爬虫
 # 该模块用了aiohttp模块 创建了一个服务器+客户端 使用谷歌的protobuf处理字节流 优点是更快速
 import aiohttp
+import asyncio
+import concurrent.futures
+import copy
+import datetime
+import logging
+import time
 import urllib.parse
 
 from worker.registry import Endpoint, EndpointRegistry
-from worker.server import Server
+from worker.cache import FetchStats, PageCache, normalize_url
+from worker.parse import parse_page
+from worker.server import Page, Server, run_processes
+from streaming import CHUNK_SIZE, StreamReader
 
 
 @EndpointRegistry.register
 class LeanAndMeanServer(Server):
     _endpoint = Endpoint(__file__, '127.0.0.1', 3080)
 
-    def __init__(self):
-        super().__init__(self._endpoint)
+    # one long-lived session is shared by every request so that connections, DNS
+    # lookups and TLS sessions towards the retailers are reused
+    limit = 100  # connections in total
+    limit_per_host = 8
+    keepalive_timeout = 30  # seconds
+    ttl_dns_cache = 300  # seconds
+
+    # parse_processes > 0 parses pages in a pool of processes instead of the
+    # default thread pool, so that parsing doesn't compete with the event loop for the GIL;
+    # cache_ttl > 0 keeps successfully fetched pages for that many seconds
+    def __init__(self, parse_processes=0, endpoint=None, cache_ttl=0, cache_size=64 * 1024 * 1024, **kwargs):
+        super().__init__(endpoint or self._endpoint, **kwargs)
+        self.session = None
+        self.parse_executor = concurrent.futures.ProcessPoolExecutor(parse_processes) if parse_processes else None
+        self.cache = PageCache(cache_ttl, cache_size) if cache_ttl > 0 else None
+        self.fetches = dict()  # normalized url -> task of the fetch in flight
+        self.stats = FetchStats()
         self.headers = {
             'accept': 'text/html',
             'accept-encoding': 'gzip, deflate, br',
@@ -30,22 +53,118 @@ class LeanAndMeanServer(Server):
             'user-agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.93 Safari/537.36',
         }
 
-    async def handle_request(self, request, writer):
-        self.headers['authority'] = urllib.parse.urlparse(request.url).netloc
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            timeout = request.timeout if request.timeout else 30
-            async with session.get(request.url, timeout=timeout) as r:
-                data = await r.text()
-                # 将网页信息序列化存入writer
-                writer.write(self.encode_response(
-                    response_id=request.id,
-                    data=data,
-                    status_code=r.status,
-                ))
-                writer.write_eof()
-                logging.info(f'sent response: id: {request.id}, status_code: {r.status}, data: <{len(data)} bytes>')
-
-
-def run():
-    server = LeanAndMeanServer()
+    def create_session(self):
+        try:
+            resolver = aiohttp.AsyncResolver()  # requires aiodns
+        except Exception:
+            resolver = None
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.ttl_dns_cache,
+            resolver=resolver,
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    async def handle_request(self, request):
+        stream = {'stop_markers': tuple(request.stop_markers), 'max_bytes': request.max_bytes or None}
+        page = await self.fetch(request.url, request.timeout, **stream)
+        self.record_stats()
+
+        if request.parse:
+            # the page may be shared with other requests, parse a copy
+            page = copy.copy(page)
+            loop = asyncio.get_running_loop()
+            url = urllib.parse.urlparse(request.url)
+            page.result = await loop.run_in_executor(
+                self.parse_executor, parse_page, request.url, url.netloc, page.body, page.charset, page.status_code)
+        return page
+
+    # concurrent requests for the same page share one upstream fetch, and
+    # recently fetched pages are served from the cache when it is enabled; a page
+    # read up to stop markers or max_bytes is only shared with requests asking for the same
+    async def fetch(self, url, timeout, stop_markers=(), max_bytes=None):
+        key = normalize_url(url)
+        if stop_markers or max_bytes:
+            key = (key, stop_markers, max_bytes)
+        if self.cache is not None:
+            page = self.cache.get(key)
+            if page is not None:
+                self.stats.cache_hits += 1
+                return page
+
+        task = self.fetches.get(key)
+        if task is None:
+            task = asyncio.create_task(self.fetch_impl(key, url, timeout, stop_markers, max_bytes))
+            self.fetches[key] = task
+            task.add_done_callback(lambda t: self.fetch_done(key, t))
+            self.stats.fetches += 1
+        else:
+            logging.debug(f'coalescing request for {url} with the fetch in flight')
+            self.stats.coalesced += 1
+
+        # one request giving up must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def fetch_done(self, key, task):
+        if self.fetches.get(key) is task:
+            del self.fetches[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every request waiting on it gave up
+
+    async def fetch_impl(self, key, url, timeout, stop_markers=(), max_bytes=None):
+        if self.session is None:
+            self.session = self.create_session()
+
+        # headers are built per request, the session is shared by concurrent requests
+        headers = dict(self.headers, authority=urllib.parse.urlparse(url).netloc)
+        timeout = aiohttp.ClientTimeout(total=timeout if timeout else 30)
+        start = time.monotonic()
+        async with self.session.get(url, headers=headers, timeout=timeout) as r:
+            ttfb = time.monotonic()
+            truncated = False
+            if stop_markers or max_bytes:
+                # leaving the block early drops the connection instead of reading the rest of the page
+                reader = StreamReader(stop_markers, max_bytes)
+                async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                    if reader.feed(chunk):
+                        break
+                body, truncated = reader.body, reader.truncated
+            else:
+                body = await r.read()
+            end = time.monotonic()
+            page = Page(
+                body,
+                r.status,
+                charset=r.charset,
+                final_url=str(r.url),
+                headers=list(r.headers.items()),
+                ttfb_ms=int((ttfb - start) * 1000),
+                fetch_ms=int((end - start) * 1000),
+                truncated=truncated,
+            )
+
+        if self.cache is not None and page.status_code == 200:
+            self.cache.put(key, page)
+        return page
+
+    def record_stats(self):
+        # every five minutes, report how many requests didn't need a fetch of their own
+        if datetime.datetime.now() - self.stats.since_time > datetime.timedelta(minutes=5):
+            logging.info(self.stats)
+            self.stats.reset()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown()
+
+
+def run(processes=1, socket=None, **kwargs):
+    endpoint = LeanAndMeanServer._endpoint.with_path(socket) if socket else LeanAndMeanServer._endpoint
+    if processes > 1:
+        return run_processes(LeanAndMeanServer, endpoint, processes, **kwargs)
+    server = LeanAndMeanServer(endpoint=endpoint, **kwargs)
     server.run()
@@ -0,0 +1,31 @@
+import logging
+
+from scraper import ScraperFactory
+from scraper.common import REPORTED_PHRASES
+
+
+# same shape as driver.HttpGetResponse, without pulling the browser drivers into the worker
+class Response:
+    def __init__(self, text, url, status_code):
+        self.text = text
+        self.url = url
+        self.status_code = status_code
+
+
+# parses a page with the result type registered for its domain and returns only
+# what the hunter needs; runs in a worker thread or in a process pool, so it
+# takes and returns plain picklable values
+def parse_page(url, netloc, body, charset, status_code):
+    scraper_type = ScraperFactory.get_scraper_type(netloc)
+    result_type = scraper_type.get_result_type()
+    text = body.decode(charset or 'utf-8', errors='replace')
+    result = result_type(logging.getLogger(netloc), Response(text, url, status_code), None).snapshot()
+    return {
+        'in_stock': result.in_stock,
+        'price': result.price,
+        'alert_subject': result.alert_subject,
+        'alert_content': result.alert_content,
+        'captcha': result.captcha,
+        'forbidden': result.forbidden,
+        'phrases': [phrase for phrase in REPORTED_PHRASES if phrase in result.phrases],
+    }
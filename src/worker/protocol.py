@@ -0,0 +1,63 @@
+import asyncio
+import gzip
+import struct
+
+import worker.worker_pb2 as spec
+
+try:
+    import zstandard  # optional, enables zstd compressed responses
+except ImportError:
+    zstandard = None
+
+
+# every message on the wire is a serialized protobuf prefixed with its length
+# as a 4-byte big-endian unsigned integer, so one connection can carry many
+# requests and responses
+HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# version 1 sends the page as decoded text, version 2 sends the raw bytes plus
+# their charset (optionally compressed) along with the final url, headers and timings
+PROTOCOL_VERSION = 2
+
+# bodies smaller than this are not worth compressing
+MIN_COMPRESSION_SIZE = 1024
+
+
+def encode_frame(data: bytes) -> bytes:
+    return HEADER.pack(len(data)) + data
+
+
+async def read_frame(reader):
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise
+        return None  # the other side closed the connection between frames
+
+    size, = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise Exception(f'frame of {size} bytes exceeds the maximum frame size')
+    return await reader.readexactly(size)
+
+
+def get_supported_compressions():
+    compressions = [spec.ZSTD] if zstandard is not None else []
+    return compressions + [spec.GZIP]
+
+
+def compress(data: bytes, compression) -> bytes:
+    if compression == spec.GZIP:
+        return gzip.compress(data, compresslevel=1)
+    if compression == spec.ZSTD:
+        return zstandard.ZstdCompressor(level=1).compress(data)
+    return data
+
+
+def decompress(data: bytes, compression) -> bytes:
+    if compression == spec.GZIP:
+        return gzip.decompress(data)
+    if compression == spec.ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
@@ -1,19 +1,67 @@
+import asyncio
+import copy
 import logging
+import os
 import pathlib
+import stat
 
 
 class Endpoint:
-    def __init__(self, source_file, addr, port):
+    # path makes the endpoint a unix domain socket instead of addr:port, a path
+    # starting with '@' names an abstract socket (linux only)
+    def __init__(self, source_file, addr, port, path=None):
         self.name = pathlib.Path(source_file).stem
         self.addr = addr
         self.port = port
+        self.path = path
 
     def __repr__(self):
+        if self.path:
+            return f'{self.name}@unix:{self.path}'
         return f'{self.name}@{self.addr}:{self.port}'
 
+    def with_path(self, path):
+        endpoint = copy.copy(self)
+        endpoint.path = path
+        return endpoint
+
+    # the endpoint of the given process of a multi-process worker: consecutive
+    # ports from the endpoint's port, or numbered socket paths
+    def get_instance(self, index):
+        if not index:
+            return self
+        endpoint = copy.copy(self)
+        endpoint.port = self.port + index
+        if self.path:
+            endpoint.path = f'{self.path}.{index}'
+        return endpoint
+
+    @property
+    def socket_path(self):
+        return '\0' + self.path[1:] if self.path.startswith('@') else self.path
+
+    async def open_connection(self):
+        if self.path:
+            return await asyncio.open_unix_connection(self.socket_path)
+        return await asyncio.open_connection(self.addr, self.port)
+
+    async def start_server(self, handle):
+        if not self.path:
+            return await asyncio.start_server(handle, self.addr, self.port)
+
+        # a socket file left behind by a worker which didn't shut down cleanly would make bind fail
+        if not self.path.startswith('@') and os.path.exists(self.path) and stat.S_ISSOCK(os.stat(self.path).st_mode):
+            os.unlink(self.path)
+        return await asyncio.start_unix_server(handle, self.socket_path)
+
+    def cleanup(self):
+        if self.path and not self.path.startswith('@') and os.path.exists(self.path):
+            os.unlink(self.path)
+
 
 class EndpointRegistry:
     registry = dict()
+    servers = dict()
 
     @classmethod
     def get(cls, name):
@@ -21,9 +69,15 @@ class EndpointRegistry:
             raise Exception(f'the "{name}" endpoint does not exist in the registry')
         return cls.registry[name]
 
+    @classmethod
+    def get_server(cls, name):
+        cls.get(name)
+        return cls.servers[name]
+
     @classmethod
     def register(cls, server):
         endpoint = server._endpoint
         logging.debug(f'registering endpoint: {endpoint}')
         cls.registry[endpoint.name] = endpoint
+        cls.servers[endpoint.name] = server
         return server
@@ -1,51 +1,237 @@
 import asyncio
 import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import threading
+import time
 
 from abc import ABC, abstractmethod
 
 import worker.worker_pb2 as spec
 
+from worker.protocol import MIN_COMPRESSION_SIZE, compress, encode_frame, get_supported_compressions, read_frame
+
+
+# what a server fetched for a request
+class Page:
+    def __init__(self, body: bytes, status_code: int, **kwargs):
+        self.body = body
+        self.status_code = status_code
+        self.charset = kwargs.get('charset', None)
+        self.final_url = kwargs.get('final_url', None)
+        self.headers = kwargs.get('headers', [])
+        self.ttfb_ms = kwargs.get('ttfb_ms', 0)
+        self.fetch_ms = kwargs.get('fetch_ms', 0)
+        self.result = kwargs.get('result', None)  # what worker.parse.parse_page made of the body
+        self.truncated = kwargs.get('truncated', False)  # the body stops at a stop marker or max_bytes
+
+    @property
+    def text(self):
+        return self.body.decode(self.charset or 'utf-8', errors='replace')
+
 
 class Server(ABC):
-    def __init__(self, endpoint):
+    # every process of a multi-process worker listens on its own endpoint; at most
+    # max_in_flight requests are handled at once (no limit if None) and up to
+    # max_queued more wait for a slot, anything beyond that is answered as busy
+    def __init__(self, endpoint, max_in_flight=None, max_queued=0):
+        self._endpoint = endpoint
         self._response = spec.Response()
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.in_flight = 0
+        self.queued = 0
+        self.slots = None
 
     def decode_request(self, data) -> spec.Request:
         request = spec.Request()
         request.ParseFromString(data)
         return request
 
-    def encode_response(self, response_id: int, data: str, status_code: int) -> str:
+    def encode_response(self, request, page) -> str:
+        self._response.Clear()
+        self._response.id = request.id
+        if page is None:
+            self._response.status_code = 0  # tells the client the request failed
+            return self._response.SerializeToString()
+
+        self._response.status_code = page.status_code
+        if not request.version or request.version < 2:
+            self._response.data = page.text
+            return self._response.SerializeToString()
+
+        # a parsed page only sends its result back, not the body
+        body, compression = page.body if page.result is None else b'', spec.NONE
+        if page.result is not None:
+            self.encode_result(page.result)
+        elif len(body) >= MIN_COMPRESSION_SIZE:
+            supported = get_supported_compressions()
+            for accepted in request.accept_compression:
+                if accepted in supported:
+                    body, compression = compress(body, accepted), accepted
+                    break
+
+        self._response.body = body
+        self._response.compression = compression
+        if page.charset:
+            self._response.charset = page.charset
+        if page.final_url:
+            self._response.final_url = page.final_url
+        for name, value in page.headers:
+            header = self._response.headers.add()
+            header.name = name
+            header.value = value
+        self._response.ttfb_ms = page.ttfb_ms
+        self._response.fetch_ms = page.fetch_ms
+        if page.truncated:
+            self._response.truncated = True
+        return self._response.SerializeToString()
+
+    def encode_result(self, result):
+        self._response.result.in_stock = result['in_stock']
+        self._response.result.captcha = result['captcha']
+        self._response.result.forbidden = result['forbidden']
+        self._response.result.phrases.extend(result['phrases'])
+        for field in ('price', 'alert_subject', 'alert_content'):
+            if result[field] is not None:
+                setattr(self._response.result, field, result[field])
+
+    def encode_busy(self, request) -> str:
         self._response.Clear()
-        self._response.id = response_id
-        self._response.data = data
-        self._response.status_code = status_code
+        self._response.id = request.id
+        self._response.status_code = 0
+        self._response.busy = True
         return self._response.SerializeToString()
 
+    # returns False if the request can neither start right away nor wait for a slot
+    def admit(self):
+        if self.max_in_flight is None:
+            return True
+        return self.in_flight + self.queued < self.max_in_flight + self.max_queued
+
+    async def handle_admitted(self, request):
+        if self.max_in_flight is None:
+            return await self.handle_request(request)
+
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_in_flight)
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        try:
+            return await self.handle_request(request)
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
     #此处的输入reader writer 应该是在建立连接的时候附带的参数 详情查看client.get_impl函数
     #而且是client的writer=>服务器的reader=>服务器的writer=>client的reader这样一个流程
+    # a client keeps its connection open and may have many requests in flight on it,
+    # every request is handled in its own task and answered as soon as it is done
     async def handle(self, reader, writer):
+        tasks = set()
         try:
-            #先对序列信息进行解码
-            request = self.decode_request(await reader.read())
-            logging.info(f'received request: id: {request.id}, url: {request.url}, timeout: {request.timeout}')
-            #等待handle_request获取网页信息然后返回内容
-            await self.handle_request(request, writer)
+            while True:
+                data = await read_frame(reader)
+                if data is None:
+                    break
+                #先对序列信息进行解码
+                request = self.decode_request(data)
+                logging.info(f'received request: id: {request.id}, url: {request.url}, timeout: {request.timeout}')
+                task = asyncio.create_task(self.respond(request, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
         except Exception as e:
-            logging.error(f'something went wrong during request: {e}')
+            logging.error(f'something went wrong while reading requests: {e}')
 
+        for task in tasks:
+            task.cancel()
         writer.close()
         await writer.wait_closed()
 
+    async def respond(self, request, writer):
+        if not self.admit():
+            logging.warning(f'too busy for request: id: {request.id}, {self.in_flight} requests in flight and {self.queued} queued')
+            if not writer.is_closing():
+                writer.write(encode_frame(self.encode_busy(request)))
+            return
+
+        try:
+            #等待handle_request获取网页信息然后返回内容
+            page = await self.handle_admitted(request)
+        except Exception as e:
+            logging.error(f'something went wrong during request: {e}')
+            page = None
+
+        if not writer.is_closing():
+            data = self.encode_response(request, page)
+            writer.write(encode_frame(data))
+            status_code = page.status_code if page is not None else 0
+            logging.info(f'sent response: id: {request.id}, status_code: {status_code}, data: <{len(data)} bytes>')
+
+    # returns the fetched Page
     @abstractmethod
-    async def handle_request(self, request, writer):
+    async def handle_request(self, request):
+        pass
+
+    # releases whatever the server holds on to (sessions, pools, ...) on shutdown
+    async def close(self):
         pass
 
     async def run_impl(self):
         #启动服务器 服务器的回应是handle函数
-        server = await asyncio.start_server(self.handle, self._endpoint.addr, self._endpoint.port)
-        async with server:
-            await server.serve_forever()
+        server = await self._endpoint.start_server(self.handle)
+        logging.info(f'listening on {self._endpoint}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.close()
+            self._endpoint.cleanup()
 
     def run(self):
         asyncio.run(self.run_impl())
+
+
+def run_server(server_type, endpoint, **kwargs):
+    # go down with the process which started us instead of lingering on without a supervisor
+    parent = multiprocessing.parent_process()
+    threading.Thread(target=lambda: (parent.join(), os._exit(1)), daemon=True).start()
+    server_type(endpoint=endpoint, **kwargs).run()
+
+
+# runs one server process per endpoint instance (see Endpoint.get_instance)
+# and restarts the processes that die; clients balance requests across all of them
+def run_processes(server_type, endpoint, processes, **kwargs):
+    running = dict()
+
+    def start(index):
+        instance = endpoint.get_instance(index)
+        process = multiprocessing.Process(target=run_server, args=(server_type, instance), kwargs=kwargs, name=f'{instance}')
+        process.start()
+        running[index] = process
+
+    # make sure the processes go down with us when we are terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for index in range(processes):
+            start(index)
+        while True:
+            multiprocessing.connection.wait([p.sentinel for p in running.values()])
+            for index, process in list(running.items()):
+                if not process.is_alive():
+                    logging.error(f'worker process {process.name} exited with code {process.exitcode}, restarting it')
+                    time.sleep(1)  # don't spin if it keeps dying
+                    start(index)
+    finally:
+        for process in running.values():
+            process.terminate()
+        for process in running.values():
+            process.join()
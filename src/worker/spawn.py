@@ -0,0 +1,128 @@
+import atexit
+import logging
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+
+RUN_WORKER = pathlib.Path(__file__).parent.parent.absolute() / 'run_worker.py'
+
+
+def is_listening(endpoint):
+    if endpoint.path:
+        s, address = socket.socket(socket.AF_UNIX), endpoint.socket_path
+    else:
+        s, address = socket.socket(), (endpoint.addr, endpoint.port)
+    with s:
+        s.settimeout(1)
+        try:
+            s.connect(address)
+            return True
+        except OSError:
+            return False
+
+
+def is_running(endpoint, processes):
+    return all(is_listening(endpoint.get_instance(i)) for i in range(processes))
+
+
+def wait_until_ready(endpoint, processes, timeout):
+    deadline = time.monotonic() + timeout
+    while not is_running(endpoint, processes):
+        if time.monotonic() > deadline:
+            raise Exception(f'the {endpoint} worker did not come up within {timeout} seconds')
+        time.sleep(0.1)
+    logging.debug(f'the {endpoint} worker is ready')
+
+
+# runs the worker's server on a background thread of the hunter itself and
+# starts it over if it crashes, unless some other worker already listens there
+class ThreadWorker:
+    def __init__(self, server_type, endpoint):
+        self.server_type = server_type
+        self.endpoint = endpoint
+
+    def start(self):
+        threading.Thread(target=self.run, name=f'{self.endpoint.name}-worker', daemon=True).start()
+
+    def run(self):
+        while True:
+            if is_listening(self.endpoint):
+                time.sleep(1)
+                continue
+            try:
+                self.server_type(endpoint=self.endpoint).run()
+            except Exception as e:
+                logging.error(f'the {self.endpoint} worker crashed, restarting it: {e}')
+            time.sleep(1)  # don't spin if it keeps crashing
+
+
+# runs run_worker.py as a child process and restarts it whenever it exits;
+# a worker which is already listening (started by hand, or left behind by
+# another hunter) is used as it is
+class ProcessWorker:
+    def __init__(self, endpoint, processes):
+        self.endpoint = endpoint
+        self.processes = processes
+        self.args = [sys.executable, str(RUN_WORKER), endpoint.name, '--processes', str(processes)]
+        if endpoint.path:
+            self.args += ['--socket', endpoint.path]
+        self.process = None
+        self.stopped = False
+        atexit.register(self.stop)
+
+    def start(self):
+        threading.Thread(target=self.supervise, name=f'{self.endpoint.name}-supervisor', daemon=True).start()
+
+    def supervise(self):
+        while not self.stopped:
+            if is_running(self.endpoint, self.processes):
+                time.sleep(1)
+                continue
+
+            logging.info(f'starting the {self.endpoint} worker')
+            self.process = subprocess.Popen(self.args)
+            code = self.process.wait()
+            if not self.stopped:
+                logging.error(f'the {self.endpoint} worker exited with code {code}, restarting it')
+                time.sleep(1)  # don't spin if it keeps dying
+
+    def stop(self):
+        self.stopped = True
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+# several hunters share one worker process: whichever hunter holds the lock
+# file runs it, and another one takes over when that hunter goes away
+class SharedWorker(ProcessWorker):
+    def __init__(self, endpoint, processes):
+        if fcntl is None:
+            raise Exception('the shared worker spawn mode needs file locks (fcntl), which this platform lacks; use thread or process')
+        super().__init__(endpoint, processes)
+        if endpoint.path and not endpoint.path.startswith('@'):
+            self.lock_path = f'{endpoint.path}.lock'
+        else:
+            name = endpoint.path[1:] if endpoint.path else f'{endpoint.name}-{endpoint.port}'
+            self.lock_path = str(pathlib.Path(tempfile.gettempdir()) / f'inventory-hunter-{name}.lock')
+        self.owner = False
+
+    def supervise(self):
+        with open(self.lock_path, 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # blocks for as long as another hunter runs the worker
+            logging.info(f'this hunter now runs the shared {self.endpoint} worker')
+            self.owner = True
+            super().supervise()
@@ -2,9 +2,9 @@
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
 # source: worker.proto
 """Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
 from google.protobuf import descriptor as _descriptor
-from google.protobuf import message as _message
-from google.protobuf import reflection as _reflection
+from google.protobuf import descriptor_pool as _descriptor_pool
 from google.protobuf import symbol_database as _symbol_database
 # @@protoc_insertion_point(imports)
 
@@ -13,126 +13,21 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor.FileDescriptor(
-  name='worker.proto',
-  package='worker',
-  syntax='proto2',
-  serialized_options=None,
-  create_key=_descriptor._internal_create_key,
-  serialized_pb=b'\n\x0cworker.proto\x12\x06worker\"3\n\x07Request\x12\n\n\x02id\x18\x01 \x01(\r\x12\x0b\n\x03url\x18\x02 \x01(\t\x12\x0f\n\x07timeout\x18\x03 \x01(\r\"9\n\x08Response\x12\n\n\x02id\x18\x01 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\t\x12\x13\n\x0bstatus_code\x18\x03 \x01(\r'
-)
-
-
-
-
-_REQUEST = _descriptor.Descriptor(
-  name='Request',
-  full_name='worker.Request',
-  filename=None,
-  file=DESCRIPTOR,
-  containing_type=None,
-  create_key=_descriptor._internal_create_key,
-  fields=[
-    _descriptor.FieldDescriptor(
-      name='id', full_name='worker.Request.id', index=0,
-      number=1, type=13, cpp_type=3, label=1,
-      has_default_value=False, default_value=0,
-      message_type=None, enum_type=None, containing_type=None,
-      is_extension=False, extension_scope=None,
-      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
-    _descriptor.FieldDescriptor(
-      name='url', full_name='worker.Request.url', index=1,
-      number=2, type=9, cpp_type=9, label=1,
-      has_default_value=False, default_value=b"".decode('utf-8'),
-      message_type=None, enum_type=None, containing_type=None,
-      is_extension=False, extension_scope=None,
-      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
-    _descriptor.FieldDescriptor(
-      name='timeout', full_name='worker.Request.timeout', index=2,
-      number=3, type=13, cpp_type=3, label=1,
-      has_default_value=False, default_value=0,
-      message_type=None, enum_type=None, containing_type=None,
-      is_extension=False, extension_scope=None,
-      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
-  ],
-  extensions=[
-  ],
-  nested_types=[],
-  enum_types=[
-  ],
-  serialized_options=None,
-  is_extendable=False,
-  syntax='proto2',
-  extension_ranges=[],
-  oneofs=[
-  ],
-  serialized_start=24,
-  serialized_end=75,
-)
-
-
-_RESPONSE = _descriptor.Descriptor(
-  name='Response',
-  full_name='worker.Response',
-  filename=None,
-  file=DESCRIPTOR,
-  containing_type=None,
-  create_key=_descriptor._internal_create_key,
-  fields=[
-    _descriptor.FieldDescriptor(
-      name='id', full_name='worker.Response.id', index=0,
-      number=1, type=13, cpp_type=3, label=1,
-      has_default_value=False, default_value=0,
-      message_type=None, enum_type=None, containing_type=None,
-      is_extension=False, extension_scope=None,
-      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
-    _descriptor.FieldDescriptor(
-      name='data', full_name='worker.Response.data', index=1,
-      number=2, type=9, cpp_type=9, label=1,
-      has_default_value=False, default_value=b"".decode('utf-8'),
-      message_type=None, enum_type=None, containing_type=None,
-      is_extension=False, extension_scope=None,
-      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
-    _descriptor.FieldDescriptor(
-      name='status_code', full_name='worker.Response.status_code', index=2,
-      number=3, type=13, cpp_type=3, label=1,
-      has_default_value=False, default_value=0,
-      message_type=None, enum_type=None, containing_type=None,
-      is_extension=False, extension_scope=None,
-      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
-  ],
-  extensions=[
-  ],
-  nested_types=[],
-  enum_types=[
-  ],
-  serialized_options=None,
-  is_extendable=False,
-  syntax='proto2',
-  extension_ranges=[],
-  oneofs=[
-  ],
-  serialized_start=77,
-  serialized_end=134,
-)
-
-DESCRIPTOR.message_types_by_name['Request'] = _REQUEST
-DESCRIPTOR.message_types_by_name['Response'] = _RESPONSE
-_sym_db.RegisterFileDescriptor(DESCRIPTOR)
-
-Request = _reflection.GeneratedProtocolMessageType('Request', (_message.Message,), {
-  'DESCRIPTOR' : _REQUEST,
-  '__module__' : 'worker_pb2'
-  # @@protoc_insertion_point(class_scope:worker.Request)
-  })
-_sym_db.RegisterMessage(Request)
-
-Response = _reflection.GeneratedProtocolMessageType('Response', (_message.Message,), {
-  'DESCRIPTOR' : _RESPONSE,
-  '__module__' : 'worker_pb2'
-  # @@protoc_insertion_point(class_scope:worker.Response)
-  })
-_sym_db.RegisterMessage(Response)
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0cworker.proto\x12\x06worker\"\xad\x01\n\x07Request\x12\n\n\x02id\x18\x01 \x01(\r\x12\x0b\n\x03url\x18\x02 \x01(\t\x12\x0f\n\x07timeout\x18\x03 \x01(\r\x12\x0f\n\x07version\x18\x04 \x01(\r\x12/\n\x12\x61\x63\x63\x65pt_compression\x18\x05 \x03(\x0e\x32\x13.worker.Compression\x12\r\n\x05parse\x18\x06 \x01(\x08\x12\x14\n\x0cstop_markers\x18\x07 \x03(\x0c\x12\x11\n\tmax_bytes\x18\x08 \x01(\r\"\x8c\x01\n\x06Result\x12\x10\n\x08in_stock\x18\x01 \x01(\x08\x12\r\n\x05price\x18\x02 \x01(\x01\x12\x15\n\ralert_subject\x18\x03 \x01(\t\x12\x15\n\ralert_content\x18\x04 \x01(\t\x12\x0f\n\x07\x63\x61ptcha\x18\x05 \x01(\x08\x12\x11\n\tforbidden\x18\x06 \x01(\x08\x12\x0f\n\x07phrases\x18\x07 \x03(\t\"%\n\x06Header\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t\"\x9a\x02\n\x08Response\x12\n\n\x02id\x18\x01 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\t\x12\x13\n\x0bstatus_code\x18\x03 \x01(\r\x12\x0c\n\x04\x62ody\x18\x04 \x01(\x0c\x12\x0f\n\x07\x63harset\x18\x05 \x01(\t\x12(\n\x0b\x63ompression\x18\x06 \x01(\x0e\x32\x13.worker.Compression\x12\x11\n\tfinal_url\x18\x07 \x01(\t\x12\x1f\n\x07headers\x18\x08 \x03(\x0b\x32\x0e.worker.Header\x12\x0f\n\x07ttfb_ms\x18\t \x01(\r\x12\x10\n\x08\x66\x65tch_ms\x18\n \x01(\r\x12\x1e\n\x06result\x18\x0b \x01(\x0b\x32\x0e.worker.Result\x12\x0c\n\x04\x62usy\x18\x0c \x01(\x08\x12\x11\n\ttruncated\x18\r \x01(\x08*+\n\x0b\x43ompression\x12\x08\n\x04NONE\x10\x00\x12\x08\n\x04GZIP\x10\x01\x12\x08\n\x04ZSTD\x10\x02')
 
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'worker_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
 
+  DESCRIPTOR._options = None
+  _COMPRESSION._serialized_start=667
+  _COMPRESSION._serialized_end=710
+  _REQUEST._serialized_start=25
+  _REQUEST._serialized_end=198
+  _RESULT._serialized_start=201
+  _RESULT._serialized_end=341
+  _HEADER._serialized_start=343
+  _HEADER._serialized_end=380
+  _RESPONSE._serialized_start=383
+  _RESPONSE._serialized_end=665
 # @@protoc_insertion_point(module_scope)
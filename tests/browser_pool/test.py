@@ -0,0 +1,82 @@
+import unittest
+
+from driver import BrowserPool
+
+
+class FakeBrowser:
+    def __init__(self, slot):
+        self.slot = slot
+        self.alive = True
+        self.quit_called = False
+
+    @property
+    def window_handles(self):
+        if not self.alive:
+            raise Exception('chrome not reachable')
+        return ['main']
+
+    def quit(self):
+        self.quit_called = True
+
+
+class BrowserPoolFixture(unittest.TestCase):
+    def setUp(self):
+        self.started = []
+        self.pool = BrowserPool(self.factory, size=2, recycle_after=3)
+
+    def factory(self, slot):
+        browser = FakeBrowser(slot)
+        self.started.append(browser)
+        return browser
+
+    def test_reuse(self):
+        with self.pool.browser() as first:
+            pass
+        with self.pool.browser() as second:
+            pass
+        self.assertEqual(len(self.started), 2)
+        with self.pool.browser() as third:
+            pass
+        self.assertIs(third, first)
+        self.assertIsNot(first, second)
+        self.assertNotEqual(first.slot, second.slot)
+
+    def test_recycle_after(self):
+        for _ in range(6):
+            with self.pool.browser():
+                pass
+        self.assertEqual(len(self.started), 2)
+        self.assertTrue(all(b.quit_called for b in self.started))
+
+    def test_recycle_after_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.browser() as browser:
+                raise RuntimeError('page crashed')
+        self.assertTrue(browser.quit_called)
+
+    def test_unhealthy_browser_is_replaced(self):
+        with self.pool.browser() as browser:
+            pass
+        with self.pool.browser():
+            pass
+        browser.alive = False
+        with self.pool.browser() as replacement:
+            pass
+        self.assertIsNot(replacement, browser)
+        self.assertEqual(replacement.slot, browser.slot)
+        self.assertTrue(browser.quit_called)
+
+    def test_failed_start_returns_slot(self):
+        failing = BrowserPool(self.fail, size=2, recycle_after=3)
+        for _ in range(3):
+            with self.assertRaises(Exception):
+                with failing.browser():
+                    pass
+        failing.factory = self.factory
+        for _ in range(2):
+            with failing.browser() as browser:
+                self.assertIsInstance(browser, FakeBrowser)
+
+    @staticmethod
+    def fail(slot):
+        raise Exception('chromedriver failed to start')
@@ -0,0 +1,52 @@
+import unittest
+
+from conftest import FakeClock
+from breaker import CircuitBreaker
+
+
+class CircuitBreakerFixture(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker('www.newegg.com', threshold=2, backoff=10, max_backoff=30, timefunc=self.clock)
+
+    def trip(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.record_failure())
+
+    def test_opens_after_threshold(self):
+        self.assertFalse(self.breaker.record_failure())
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.record_failure())
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.record_failure())
+
+    def test_single_probe_when_half_open(self):
+        self.trip()
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_backoff_grows_until_max(self):
+        self.trip()
+        for expected in (20, 30, 30):
+            self.clock.now = self.breaker.retry_time
+            self.assertTrue(self.breaker.allow())
+            self.assertTrue(self.breaker.record_failure())
+            self.assertEqual(self.breaker.backoff, expected)
+            self.assertFalse(self.breaker.allow())
+
+    def test_probe_error_reopens(self):
+        self.trip()
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_error()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.backoff, 10)
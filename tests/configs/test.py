@@ -0,0 +1,74 @@
+import io
+import pathlib
+import tempfile
+import unittest
+
+from config import merge_configs, parse_config, parse_configs
+
+
+NEWEGG_CONFIG = '''
+refresh_interval: 2
+max_price: 650
+concurrency: 4
+rate_limits:
+  newegg.com:
+    rate: 1
+urls:
+  - https://www.newegg.com/p/N82E16814137605
+  - https://www.newegg.com/p/N82E16814137602
+'''
+
+AMAZON_CONFIG = '''
+refresh_interval: 30
+domain_concurrency: 2
+rate_limits:
+  newegg.com:
+    rate: 0.5
+urls:
+  - https://www.amazon.com/dp/B08L8LG4M3
+  - https://www.newegg.com/p/N82E16814487528
+'''
+
+ALERTERS_CONFIG = '''
+alerters:
+  email:
+    relay: 127.0.0.1
+'''
+
+
+class ParseConfigsFixture(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp_dir.name)
+        (self.dir / 'newegg.yaml').write_text(NEWEGG_CONFIG)
+        (self.dir / 'amazon.yaml').write_text(AMAZON_CONFIG)
+        (self.dir / 'alerters.yaml').write_text(ALERTERS_CONFIG)
+        self.configs = parse_configs([self.dir])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_directory(self):
+        self.assertEqual([c.name for c in self.configs], ['amazon', 'newegg'])
+
+    def test_per_config_settings(self):
+        amazon, newegg = self.configs
+        self.assertEqual(amazon.refresh_interval, 30)
+        self.assertIsNone(amazon.max_price)
+        self.assertEqual(newegg.refresh_interval, 2)
+        self.assertEqual(newegg.max_price, 650)
+
+    def test_unique_nicknames(self):
+        nicknames = [url.nickname for c in self.configs for url in c.urls]
+        self.assertEqual(len(nicknames), len(set(nicknames)))
+
+    def test_merge(self):
+        merged = merge_configs(self.configs)
+        self.assertEqual(merged.concurrency, 4)
+        self.assertEqual(merged.domain_concurrency, 2)
+        self.assertEqual(merged.rate_limits['newegg.com']['rate'], 0.5)
+        self.assertEqual(merged.refresh_interval, 30)
+
+    def test_single_config(self):
+        config = parse_config(io.StringIO(NEWEGG_CONFIG))
+        self.assertIs(merge_configs([config]), config)
@@ -0,0 +1,117 @@
+import asyncio
+import pathlib
+import tempfile
+import threading
+import time
+import unittest
+
+import aiohttp
+import aiohttp.web
+
+from config import URL
+from conftest import FakeDriverRepo
+from driver import Driver, HttpGetResponse, LeanAndMeanDriver, RequestsDriver
+from ratelimit import RateLimiter
+from scraper.common import GenericScraper
+from worker.client import Client
+from worker.registry import Endpoint
+from worker.server import Page, Server
+
+
+NUM_REQUESTS = 200
+PAGE = '<html><body><button>Add to Cart</button>' + 'x' * 10000 + '</body></html>'
+
+
+# a local stand-in for a retailer which is slow to answer
+async def start_upstream():
+    async def handler(request):
+        await asyncio.sleep(0.05)
+        return aiohttp.web.Response(text=PAGE, content_type='text/html')
+
+    app = aiohttp.web.Application()
+    app.router.add_get('/{tail:.*}', handler)
+    runner = aiohttp.web.AppRunner(app)
+    await runner.setup()
+    site = aiohttp.web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+class ThreadedDriver(Driver):
+    def get_impl(self, url):
+        self.thread = threading.current_thread()
+        return HttpGetResponse(PAGE, url)
+
+
+class DriverAdapterTest(unittest.TestCase):
+    def test_sync_driver_runs_on_a_thread(self):
+        driver = ThreadedDriver(limiter=RateLimiter({'default': {'rate': 100, 'burst': 1}}))
+        url = URL('https://www.newegg.com/p/1')
+
+        async def run():
+            return await asyncio.gather(*[driver.get_async(url) for _ in range(3)])
+
+        start = time.perf_counter()
+        responses = asyncio.run(run())
+        self.assertTrue(all(r.text == PAGE for r in responses))
+        self.assertIsNot(driver.thread, threading.current_thread())
+        # the rate limit is waited out without blocking the event loop
+        self.assertGreaterEqual(time.perf_counter() - start, 0.02)
+
+
+class RequestsDriverAsyncTest(unittest.TestCase):
+    def test_many_fetches_on_one_loop(self):
+        driver = RequestsDriver(timeout=10, pool_size=8)
+
+        async def run():
+            runner, port = await start_upstream()
+            try:
+                url = URL(f'http://127.0.0.1:{port}/p/1')
+                start = time.perf_counter()
+                responses = await asyncio.gather(*[driver.get_async(url) for _ in range(NUM_REQUESTS)])
+                elapsed = time.perf_counter() - start
+                await driver.close_async()
+                return responses, elapsed
+            finally:
+                await runner.cleanup()
+
+        responses, elapsed = asyncio.run(run())
+        self.assertTrue(all(r.status_code == 200 and r.text == PAGE for r in responses))
+        self.assertEqual(responses[0].content, PAGE.encode())
+        # 8 connections, 50 ms per request: far less than the 10 s it takes one at a time
+        self.assertLess(elapsed, NUM_REQUESTS * 0.05 / 2)
+
+
+class EchoServer(Server):
+    def __init__(self):
+        super().__init__(None)
+
+    async def handle_request(self, request):
+        return Page(PAGE.encode(), 200, charset='utf-8', final_url=request.url)
+
+
+class LeanAndMeanDriverAsyncTest(unittest.TestCase):
+    def test_get_async(self):
+        driver = LeanAndMeanDriver(timeout=10)
+
+        async def run():
+            listener = await asyncio.start_server(EchoServer().handle, '127.0.0.1', 0)
+            driver.client = Client(Endpoint(__file__, '127.0.0.1', listener.sockets[0].getsockname()[1]))
+            async with listener:
+                return await asyncio.gather(*[driver.get_async(URL(f'https://www.newegg.com/p/{i}')) for i in range(20)])
+
+        responses = asyncio.run(run())
+        driver.client.close()
+        self.assertEqual([r.url for r in responses], [f'https://www.newegg.com/p/{i}' for i in range(20)])
+        self.assertTrue(all(r.text == PAGE for r in responses))
+
+
+class ScrapeAsyncTest(unittest.TestCase):
+    def test_scrape_async(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            drivers = FakeDriverRepo(tmp, {'requests': ThreadedDriver()})
+            scraper = GenericScraper(drivers, URL('https://www.example.com/p/1'))
+            result = asyncio.run(scraper.scrape_async())
+            self.assertTrue(result)
+            self.assertEqual(scraper.stats.num_successful, 1)
+            self.assertTrue((pathlib.Path(tmp) / 'covfefe.html').exists())
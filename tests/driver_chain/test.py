@@ -0,0 +1,189 @@
+import asyncio
+import concurrent.futures
+import pathlib
+import tempfile
+import time
+import unittest
+
+import yaml
+
+from chain import DriverChain, LatencyTracker
+from config import URL, parse_drivers
+from conftest import FakeDriverRepo, PageDriver
+
+
+IN_STOCK = '<html><body><button>Add to Cart</button></body></html>'
+CAPTCHA = '<html><body>Please solve this captcha</body></html>'
+
+
+class Fetched:
+    def __init__(self, name, usable=True):
+        self.name = name
+        self.usable = usable
+
+
+def is_usable(fetched):
+    return fetched is not None and fetched.usable
+
+
+class LatencyTrackerTest(unittest.TestCase):
+    def test_percentile(self):
+        latency = LatencyTracker(window=100, min_samples=20)
+        for i in range(19):
+            latency.record('a', i)
+        self.assertIsNone(latency.get_percentile('a', 95))
+        for i in range(19, 100):
+            latency.record('a', i)
+        self.assertEqual(latency.get_percentile('a', 95), 94)
+        self.assertEqual(latency.get_percentile('a', 50), 50)
+
+    def test_window(self):
+        latency = LatencyTracker(window=20, min_samples=20)
+        for i in range(100):
+            latency.record('a', i)
+        self.assertEqual(latency.get_percentile('a', 0), 80)
+
+
+class DriverChainTest(unittest.TestCase):
+    def setUp(self):
+        self.latency = LatencyTracker(min_samples=1)
+        self.executor = concurrent.futures.ThreadPoolExecutor(4)
+        self.calls = []
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def make_fetch(self, delays, unusable=()):
+        def fetch(name):
+            self.calls.append(name)
+            time.sleep(delays.get(name, 0))
+            return Fetched(name, name not in unusable)
+        return fetch
+
+    def test_falls_through_when_blocked(self):
+        chain = DriverChain(['lean_and_mean', 'requests', 'puppeteer'])
+        result = chain.run('www.amazon.com', self.make_fetch({}, unusable={'lean_and_mean', 'requests'}), is_usable)
+        self.assertEqual(result.name, 'puppeteer')
+        self.assertEqual(self.calls, ['lean_and_mean', 'requests', 'puppeteer'])
+
+    def test_stops_at_first_usable(self):
+        chain = DriverChain(['lean_and_mean', 'puppeteer'])
+        self.assertEqual(chain.run('www.amazon.com', self.make_fetch({}), is_usable).name, 'lean_and_mean')
+        self.assertEqual(self.calls, ['lean_and_mean'])
+
+    def test_last_result_when_nothing_is_usable(self):
+        chain = DriverChain(['lean_and_mean', 'puppeteer'])
+        result = chain.run('www.amazon.com', self.make_fetch({}, unusable={'lean_and_mean', 'puppeteer'}), is_usable)
+        self.assertEqual(result.name, 'puppeteer')
+
+    def test_no_hedging_without_latencies(self):
+        chain = DriverChain(['lean_and_mean', 'puppeteer'], LatencyTracker(), self.executor)
+        chain.run('www.amazon.com', self.make_fetch({'lean_and_mean': 0.1}), is_usable)
+        self.assertEqual(self.calls, ['lean_and_mean'])
+
+    def test_hedge_wins_when_primary_is_slow(self):
+        self.latency.record(('www.amazon.com', 'lean_and_mean'), 0.05)
+        chain = DriverChain(['lean_and_mean', 'puppeteer'], self.latency, self.executor)
+        start = time.perf_counter()
+        result = chain.run('www.amazon.com', self.make_fetch({'lean_and_mean': 1.0, 'puppeteer': 0.05}), is_usable)
+        self.assertEqual(result.name, 'puppeteer')
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_fast_primary_is_not_hedged(self):
+        self.latency.record(('www.amazon.com', 'lean_and_mean'), 0.5)
+        chain = DriverChain(['lean_and_mean', 'puppeteer'], self.latency, self.executor)
+        result = chain.run('www.amazon.com', self.make_fetch({'lean_and_mean': 0.01}), is_usable)
+        self.assertEqual(result.name, 'lean_and_mean')
+        self.assertEqual(self.calls, ['lean_and_mean'])
+
+    # a fetch waiting for a free thread isn't slow yet
+    def test_queueing_is_not_latency(self):
+        self.latency.record(('www.amazon.com', 'lean_and_mean'), 0.05)
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        executor.submit(time.sleep, 0.3)
+        chain = DriverChain(['lean_and_mean', 'puppeteer'], self.latency, executor)
+        result = chain.run('www.amazon.com', self.make_fetch({'lean_and_mean': 0.01}), is_usable)
+        self.assertEqual(result.name, 'lean_and_mean')
+        self.assertEqual(self.calls, ['lean_and_mean'])
+
+    def test_unusable_hedge_waits_for_primary(self):
+        self.latency.record(('www.amazon.com', 'lean_and_mean'), 0.05)
+        chain = DriverChain(['lean_and_mean', 'puppeteer'], self.latency, self.executor)
+        result = chain.run('www.amazon.com', self.make_fetch({'lean_and_mean': 0.2}, unusable={'puppeteer'}), is_usable)
+        self.assertEqual(result.name, 'lean_and_mean')
+
+    def test_hedge_async(self):
+        self.latency.record(('www.amazon.com', 'lean_and_mean'), 0.05)
+        chain = DriverChain(['lean_and_mean', 'puppeteer'], self.latency, self.executor)
+        cancelled = []
+
+        async def fetch(name):
+            try:
+                await asyncio.sleep({'lean_and_mean': 1.0, 'puppeteer': 0.05}[name])
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            return Fetched(name)
+
+        result = asyncio.run(chain.run_async('www.amazon.com', fetch, is_usable))
+        self.assertEqual(result.name, 'puppeteer')
+        self.assertEqual(cancelled, ['lean_and_mean'])
+
+
+class ScraperChainTest(unittest.TestCase):
+    def scrape(self, chains, **drivers):
+        from scraper.common import GenericScraper
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = FakeDriverRepo(tmp, drivers, chains=chains)
+            scraper = GenericScraper(repo, URL('https://www.example.com/p/1'))
+            result = scraper.scrape()
+            saved = (pathlib.Path(tmp) / 'covfefe.html').read_text()
+        return scraper, result, saved
+
+    def test_forbidden_falls_through(self):
+        blocked = PageDriver('', status_code=403)
+        browser = PageDriver(IN_STOCK)
+        scraper, result, saved = self.scrape({'example.com': ['requests', 'puppeteer']}, requests=blocked, puppeteer=browser)
+        self.assertTrue(result)
+        self.assertIs(scraper.last_result, result)
+        self.assertEqual(saved, IN_STOCK)
+        self.assertEqual((blocked.calls, browser.calls), (1, 1))
+
+    def test_captcha_falls_through(self):
+        captcha = PageDriver(CAPTCHA)
+        browser = PageDriver(IN_STOCK)
+
+        from scraper.common import GenericScrapeResult
+        original = GenericScrapeResult.parse
+
+        def parse(self):
+            self.captcha = self.has_phrase('captcha')
+            original(self)
+
+        GenericScrapeResult.parse = parse
+        try:
+            _, result, _ = self.scrape({'example.com': ['lean_and_mean', 'selenium']}, lean_and_mean=captcha, selenium=browser)
+        finally:
+            GenericScrapeResult.parse = original
+        self.assertTrue(result)
+        self.assertEqual(browser.calls, 1)
+
+    def test_default_chain(self):
+        requests = PageDriver(IN_STOCK)
+        scraper, result, _ = self.scrape(dict(), requests=requests)
+        self.assertEqual(scraper.chain.names, ['requests'])
+        self.assertTrue(result)
+
+
+class ParseDriversTest(unittest.TestCase):
+    def test_parse(self):
+        data = yaml.safe_load('''
+            Amazon.com: [lean_and_mean, puppeteer]
+            www.walmart.com: requests
+        ''')
+        self.assertEqual(parse_drivers(data), {'amazon.com': ['lean_and_mean', 'puppeteer'], 'www.walmart.com': ['requests']})
+
+    def test_unknown_driver(self):
+        with self.assertRaises(Exception):
+            parse_drivers({'amazon.com': ['curl']})
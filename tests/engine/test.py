@@ -0,0 +1,152 @@
+import collections
+import tempfile
+import threading
+import time
+import unittest
+
+from config import URL, Config
+from conftest import FakeDriverRepo, PageDriver
+from hunter import Engine
+from ratelimit import RateLimiter
+from scraper.common import GenericScraper
+
+
+IN_STOCK = '<html><body><button>Add to Cart</button></body></html>'
+
+
+# records how many fetches run at once, per website and per url
+class RecordingDriver(PageDriver):
+    def __init__(self, text, delay):
+        super().__init__(text, delay=delay)
+        self.lock = threading.Lock()
+        self.in_flight = collections.Counter()
+        self.max_in_flight = collections.Counter()
+        self.started = collections.defaultdict(list)
+        self.status_codes = dict()
+
+    def get_impl(self, url):
+        with self.lock:
+            self.started[url.netloc].append(time.monotonic())
+            for key in ('total', url.netloc, str(url)):
+                self.in_flight[key] += 1
+                self.max_in_flight[key] = max(self.max_in_flight[key], self.in_flight[key])
+        try:
+            response = super().get_impl(url)
+            response.status_code = self.status_codes.get(url.netloc, 200)
+            return response
+        finally:
+            with self.lock:
+                for key in ('total', url.netloc, str(url)):
+                    self.in_flight[key] -= 1
+
+
+# stops scheduling a scraper after a number of rounds, so that run() returns
+class CountingEngine(Engine):
+    def __init__(self, alerters, config, scrapers, rounds):
+        super().__init__(alerters, config, scrapers)
+        self.rounds = rounds
+        self.scheduled = collections.Counter()
+
+    def schedule(self, s):
+        self.scheduled[s] += 1
+        if self.scheduled[s] < self.rounds:
+            super().schedule(s)
+
+
+class EngineFixture(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.driver = PageDriver(IN_STOCK)
+        self.drivers = FakeDriverRepo(self.tmp.name, {'requests': self.driver})
+        self.alerts = []
+
+    def alerters(self, **kwargs):
+        self.alerts.append(kwargs)
+
+    def make_config(self, **kwargs):
+        return Config(0.05, None, [], **kwargs)
+
+    def run_engine(self, config, scrapers, rounds=3):
+        engine = CountingEngine(self.alerters, config, scrapers, rounds)
+        thread = threading.Thread(target=engine.run, daemon=True)
+        thread.start()
+        thread.join(30)
+        self.assertFalse(thread.is_alive())
+        return engine
+
+    # a scraper built without a product config goes by the engine's
+    def test_scraper_without_config(self):
+        scraper = GenericScraper(self.drivers, URL('https://www.example.com/p/1'))
+        self.assertIsNone(scraper.config)
+        engine = self.run_engine(self.make_config(), [scraper])
+        self.assertEqual(self.driver.calls, 3)
+        self.assertEqual(engine.scheduled[scraper], 3)
+        self.assertEqual(len(self.alerts), 1)
+
+
+class SchedulingTest(EngineFixture):
+    def setUp(self):
+        super().setUp()
+        self.driver = RecordingDriver(IN_STOCK, delay=0.1)
+        self.drivers = FakeDriverRepo(self.tmp.name, {'requests': self.driver})
+
+    def make_scrapers(self, netloc, count, config=None):
+        return [GenericScraper(self.drivers, URL(f'https://{netloc}/p/{i}'), config) for i in range(count)]
+
+    def test_concurrent_dispatch(self):
+        config = self.make_config(concurrency=8)
+        scrapers = self.make_scrapers('www.example.com', 4, config) + self.make_scrapers('www.example.org', 4, config)
+        start = time.monotonic()
+        self.run_engine(config, scrapers, rounds=3)
+        self.assertEqual(self.driver.calls, 24)
+        self.assertGreater(self.driver.max_in_flight['total'], 4)
+        # one at a time, 24 fetches of 0.1s take 2.4s
+        self.assertLess(time.monotonic() - start, 1.5)
+
+    def test_domain_cap_requeues(self):
+        config = self.make_config(concurrency=8, domain_concurrency=2)
+        capped = self.make_scrapers('www.example.com', 6, config)
+        other = self.make_scrapers('www.example.org', 2, config)
+        engine = self.run_engine(config, capped + other, rounds=3)
+        self.assertEqual(self.driver.max_in_flight['www.example.com'], 2)
+        # the scrapers which waited for a slot got their turn all the same
+        self.assertTrue(all(engine.scheduled[s] == 3 for s in capped + other))
+        self.assertEqual(self.driver.calls, 24)
+        self.assertFalse(any(engine.pending.values()))
+
+    def test_scraper_never_overlaps_itself(self):
+        # the interval is shorter than a fetch, so ticks come due while the last one is still running
+        config = Config(0.01, None, [], concurrency=4)
+        scrapers = self.make_scrapers('www.example.com', 2, config)
+        self.run_engine(config, scrapers, rounds=5)
+        self.assertEqual(self.driver.calls, 10)
+        self.assertTrue(all(self.driver.max_in_flight[str(s.url)] == 1 for s in scrapers))
+
+    def test_open_breaker_skips_website(self):
+        config = self.make_config(concurrency=4, circuit_breaker={'threshold': 2, 'backoff': 60, 'max_backoff': 60})
+        self.driver.status_codes['www.example.com'] = 403
+        blocked = self.make_scrapers('www.example.com', 1, config)
+        healthy = self.make_scrapers('www.example.org', 1, config)
+        engine = self.run_engine(config, blocked + healthy, rounds=6)
+        # two 403s open the breaker, the remaining ticks are skipped without a fetch
+        self.assertEqual(len(self.driver.started['www.example.com']), 2)
+        self.assertEqual(len(self.driver.started['www.example.org']), 6)
+        self.assertEqual(engine.scheduled[blocked[0]], 6)
+        self.assertEqual(engine.breakers.get('www.example.com').state, 'open')
+
+    def test_rate_limit(self):
+        self.drivers = FakeDriverRepo(self.tmp.name, {'requests': self.driver},
+                                      limiter=RateLimiter({'example.com': {'rate': 20, 'burst': 1}}))
+        config = self.make_config(concurrency=8)
+        scrapers = self.make_scrapers('www.example.com', 4, config) + self.make_scrapers('www.example.org', 4, config)
+        self.run_engine(config, scrapers, rounds=2)
+        started = self.driver.started['www.example.com']
+        self.assertEqual(len(started), 8)
+        # one fetch every 50 ms at most, while the other website isn't held back
+        self.assertGreaterEqual(min(b - a for a, b in zip(started, started[1:])), 0.04)
+        self.assertGreater(self.driver.max_in_flight['www.example.org'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import pathlib
+import tempfile
+import unittest
+
+from config import URL
+from conftest import FakeDriverRepo, PageDriver
+from driver import HttpGetResponse
+from scraper.newegg import NeweggScraper
+
+
+NEWEGG_PAGE = (pathlib.Path(__file__).parent.parent / 'newegg' / 'in_stock.html').read_text(encoding='utf-8')
+
+
+class FingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.driver = PageDriver(NEWEGG_PAGE)
+        repo = FakeDriverRepo(self.tmp.name, {'lean_and_mean': self.driver})
+        self.scraper = NeweggScraper(repo, URL('https://www.newegg.com/p/N82E16813119362'))
+        result_type = self.scraper.get_result_type()
+        self.parses = 0
+
+        def parse(result):
+            self.parses += 1
+            result_type.parse(result)
+
+        # counts the pages which actually get parsed
+        self.scraper.get_result_type = lambda: type('CountingResult', (result_type,), {'parse': parse})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unchanged_page_is_not_parsed_again(self):
+        first = self.scraper.scrape()
+        second = self.scraper.scrape()
+        self.assertEqual(self.parses, 1)
+        self.assertFalse(first.unchanged)
+        self.assertTrue(second.unchanged)
+        self.assertTrue(second.previously_in_stock)
+        self.assertEqual((second.price, second.last_price), (first.price, first.price))
+        self.assertEqual(second.alert_content, first.alert_content)
+        self.assertGreater(second.timestamp, first.timestamp)
+        self.assertEqual(second.fingerprint, first.fingerprint)
+        self.assertIn(f'50% unchanged pages (fingerprint {first.fingerprint[:12]})', repr(self.scraper.stats))
+
+    # only the region counts, the rest of the page changes on every request anyway
+    def test_change_outside_of_the_region(self):
+        self.scraper.scrape()
+        self.driver.text = NEWEGG_PAGE.replace('id="product-details"', 'id="product-details" data-nonce="1234"')
+        self.assertTrue(self.scraper.scrape().unchanged)
+        self.assertEqual(self.parses, 1)
+
+    def test_changed_page_is_parsed(self):
+        first = self.scraper.scrape()
+        self.driver.text = NEWEGG_PAGE.replace('Add to cart', 'Sold Out')
+        second = self.scraper.scrape()
+        self.assertEqual(self.parses, 2)
+        self.assertFalse(second.unchanged)
+        self.assertNotEqual(second.fingerprint, first.fingerprint)
+        self.assertFalse(second)
+        self.assertTrue(second.previously_in_stock)
+
+    def test_fingerprint_without_region(self):
+        result_type = self.scraper.get_result_type()
+        r = HttpGetResponse('<html><body><script>var nonce = 1;</script><p>Sold out</p></body></html>', 'url', status_code=200)
+        same = HttpGetResponse('<html><body><script>var nonce = 2;</script><p>Sold out</p></body></html>', 'url', status_code=200)
+        forbidden = HttpGetResponse(same.text, 'url', status_code=403)
+        self.assertIsNone(result_type.get_region(r.text))
+        fingerprint = result_type.get_fingerprint(r, None)
+        self.assertEqual(fingerprint, result_type.get_fingerprint(same, None))
+        self.assertNotEqual(fingerprint, result_type.get_fingerprint(forbidden, None))
+
+    # custom elements named like script or style aren't stripped, nor is what follows them
+    def test_fingerprint_after_custom_elements(self):
+        result_type = self.scraper.get_result_type()
+        for tag in ('style-guide', 'script-loader'):
+            with self.subTest(tag=tag):
+                page = f'<html><body><{tag}></{tag}><p>$10 Add to cart</p><script>x()</script><style>a{{}}</style></body></html>'
+                r = HttpGetResponse(page, 'url', status_code=200)
+                changed = HttpGetResponse(page.replace('$10 Add to cart', '$12 Sold out'), 'url', status_code=200)
+                self.assertNotEqual(result_type.get_fingerprint(r, None), result_type.get_fingerprint(changed, None))
+
+    # once the page settles, scrapes only fetch it
+    def test_steady_state(self):
+        self.scraper.scrape()
+        for _ in range(20):
+            self.assertTrue(self.scraper.scrape().unchanged)
+        self.assertEqual(self.driver.calls, 21)
+        self.assertEqual(self.parses, 1)
+        self.assertEqual(self.scraper.stats.num_unchanged, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+import unittest
+
+import aiohttp
+import aiohttp.web
+
+import worker.worker_pb2 as spec
+from worker.cache import PageCache, normalize_url
+from worker.lean_and_mean import LeanAndMeanServer
+from worker.server import Page
+
+
+NUM_REQUESTS = 200
+CONCURRENCY = 20
+PAGE = '<html><body>' + 'x' * 50000 + '</body></html>'
+
+
+# a local stand-in for a retailer which counts the connections it accepts
+class Upstream:
+    def __init__(self):
+        self.transports = set()
+        self.requests = 0
+
+    @property
+    def connections(self):
+        return len(self.transports)
+
+    async def start(self):
+        async def handler(request):
+            self.transports.add(request.transport)
+            self.requests += 1
+            await asyncio.sleep(0.001)
+            return aiohttp.web.Response(text=PAGE + request.headers.get('authority', ''), content_type='text/html')
+
+        app = aiohttp.web.Application()
+        app.router.add_get('/{tail:.*}', handler)
+        self.runner = aiohttp.web.AppRunner(app)
+        await self.runner.setup()
+        site = aiohttp.web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def make_request(url):
+    request = spec.Request()
+    request.url = url
+    request.timeout = 10
+    return request
+
+
+# what LeanAndMeanServer.handle_request used to do: a new session per request
+async def fetch_with_new_session(server, request):
+    async with aiohttp.ClientSession(headers=server.headers) as session:
+        async with session.get(request.url, timeout=aiohttp.ClientTimeout(total=request.timeout)) as r:
+            return Page(await r.read(), r.status, charset=r.charset)
+
+
+async def load_test(upstream, fetch):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i):
+        async with semaphore:
+            page = await fetch(make_request(f'http://127.0.0.1:{upstream.port}/p/{i}'))
+            assert page.status_code == 200 and page.text.startswith(PAGE)
+
+    upstream.transports.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(NUM_REQUESTS)])
+    return NUM_REQUESTS / (time.perf_counter() - start), upstream.connections
+
+
+class LeanAndMeanLoadTest(unittest.TestCase):
+    def test_shared_session(self):
+        async def run():
+            upstream = Upstream()
+            await upstream.start()
+            server = LeanAndMeanServer()
+            try:
+                before = await load_test(upstream, lambda r: fetch_with_new_session(server, r))
+                after = await load_test(upstream, server.handle_request)
+            finally:
+                await server.close()
+                await upstream.stop()
+            return before, after
+
+        (before_rps, before_connections), (after_rps, after_connections) = asyncio.run(run())
+        logging.info(f'{NUM_REQUESTS} requests: {before_rps:.0f} req/s over {before_connections} connections with a session per request, '
+                     f'{after_rps:.0f} req/s over {after_connections} connections with a shared session')
+        self.assertEqual(before_connections, NUM_REQUESTS)
+        self.assertLessEqual(after_connections, LeanAndMeanServer.limit_per_host)
+
+    def test_headers_per_request(self):
+        async def run():
+            upstream = Upstream()
+            await upstream.start()
+            server = LeanAndMeanServer()
+            try:
+                return await asyncio.gather(
+                    server.handle_request(make_request(f'http://127.0.0.1:{upstream.port}/a')),
+                    server.handle_request(make_request(f'http://localhost:{upstream.port}/b')),
+                )
+            finally:
+                await server.close()
+                await upstream.stop()
+
+        first, second = asyncio.run(run())
+        self.assertTrue(first.text[len(PAGE):].startswith('127.0.0.1:'))
+        self.assertTrue(second.text[len(PAGE):].startswith('localhost:'))
+        self.assertTrue(first.final_url.endswith('/a'))
+        self.assertNotIn('authority', LeanAndMeanServer().headers)
+
+
+class CoalescingTest(unittest.TestCase):
+    def test_concurrent_requests_share_a_fetch(self):
+        async def run():
+            upstream = Upstream()
+            await upstream.start()
+            server = LeanAndMeanServer()
+            try:
+                url = f'http://127.0.0.1:{upstream.port}/p/1?b=2&a=1'
+                same = f'HTTP://127.0.0.1:{upstream.port}/p/1?a=1&b=2#reviews'
+                pages = await asyncio.gather(*[server.handle_request(make_request(u)) for u in [url, same] * 5])
+                return pages, upstream.requests, server.stats
+            finally:
+                await server.close()
+                await upstream.stop()
+
+        pages, requests, stats = asyncio.run(run())
+        self.assertTrue(all(page.text.startswith(PAGE) for page in pages))
+        self.assertEqual(requests, 1)
+        self.assertEqual((stats.fetches, stats.coalesced), (1, 9))
+
+    def test_cache(self):
+        async def run():
+            upstream = Upstream()
+            await upstream.start()
+            server = LeanAndMeanServer(cache_ttl=60)
+            try:
+                for _ in range(3):
+                    await server.handle_request(make_request(f'http://127.0.0.1:{upstream.port}/p/1'))
+                return upstream.requests, server.stats
+            finally:
+                await server.close()
+                await upstream.stop()
+
+        requests, stats = asyncio.run(run())
+        self.assertEqual(requests, 1)
+        self.assertEqual(stats.cache_hits, 2)
+
+
+class PageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = PageCache(ttl=10, max_bytes=100, timefunc=lambda: self.now)
+
+    def test_ttl(self):
+        self.cache.put('a', Page(b'x' * 10, 200))
+        self.now = 9.9
+        self.assertIsNotNone(self.cache.get('a'))
+        self.now = 10.0
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.size, 0)
+
+    def test_lru_eviction(self):
+        for key in 'abc':
+            self.cache.put(key, Page(b'x' * 40, 200))
+        self.assertIsNone(self.cache.get('a'))
+
+        self.cache.get('b')
+        self.cache.put('d', Page(b'x' * 40, 200))
+        self.assertIsNone(self.cache.get('c'))
+        self.assertIsNotNone(self.cache.get('b'))
+        self.assertEqual(self.cache.size, 80)
+
+    def test_too_large(self):
+        self.cache.put('a', Page(b'x' * 101, 200))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url('HTTPS://www.Newegg.com:443/p/1?b=2&a=1#x'), 'https://www.newegg.com/p/1?a=1&b=2')
+        self.assertEqual(normalize_url('http://localhost:8080'), 'http://localhost:8080/')
@@ -0,0 +1,85 @@
+import logging
+import pathlib
+import re
+import unittest
+
+from driver import HttpGetResponse
+from scraper import ScraperFactory
+from scraper.common import REPORTED_PHRASES
+from scraper.parsers import PARSERS, LexborHTMLParser, css_to_xpath, get_parser
+
+
+TESTS_DIR = pathlib.Path(__file__).parent.parent.absolute()
+PAGE = '''<html><body>
+<div id="main" class="product  buy-box">
+  <h1 class="title_abc">Title <!-- note --><b>bold</b></h1>
+  <script>var price = 1;</script>
+  <span class="a-button-inner"><span id="submit.add-to-cart">Add to Cart</span></span>
+  <div class="pi-prod-availability">In stock</div>
+  <button class="hide add-to-cart" data-info='{"a": 1}'>Add</button>
+</div>
+</body></html>'''
+
+
+def get_fixtures():
+    for path in sorted(TESTS_DIR.glob('*/*.html')):
+        yield ScraperFactory.get_scraper_type(f'www.{path.parent.name}.com'), path
+
+
+def parse(result_type, text, parser):
+    result_type = type(result_type.__name__, (result_type,), {'parser': parser})
+    result = result_type(logging.getLogger(), HttpGetResponse(text, None), None)
+    phrases = [phrase for phrase in REPORTED_PHRASES if result.has_phrase(phrase)]
+    return bool(result), result.price, result.alert_subject, result.alert_content, result.captcha, phrases
+
+
+def backends():
+    return [name for name in PARSERS if name != 'selectolax' or LexborHTMLParser is not None]
+
+
+class ParserTest(unittest.TestCase):
+    def test_lookups(self):
+        for name in backends():
+            body = get_parser(name).parse(PAGE).body
+            with self.subTest(parser=name):
+                self.assertEqual(body.find('div', id='main')['class'], ['product', 'buy-box'])
+                self.assertEqual(body.find('div', class_='buy-box')['id'], 'main')
+                self.assertEqual(body.find('div', class_='product buy-box')['id'], 'main')
+                self.assertEqual(body.find('h1', class_=re.compile('title_.*')).text, 'Title bold')
+                self.assertIsNone(body.find('h1', class_='title'))
+                self.assertEqual(body.select_one('span.a-button-inner > span#submit\\.add-to-cart').text, 'Add to Cart')
+                self.assertEqual(body.select_one('div[class="pi-prod-availability"]').get_text(), 'In stock')
+                self.assertEqual(body.select_one('#main button.add-to-cart').attrs['data-info'], '{"a": 1}')
+                self.assertIsNone(body.select_one('div > h1 > i'))
+                self.assertNotIn('var price', body.text)
+
+    def test_unsupported_selector(self):
+        with self.assertRaises(Exception):
+            css_to_xpath('div:nth-child(2)')
+
+
+# every fixture of every retailer gives the same results with each parser as with bs4
+class DifferentialTest(unittest.TestCase):
+    def test_fixtures(self):
+        fixtures = list(get_fixtures())
+        self.assertGreater(len(fixtures), 10)
+        for scraper_type, path in fixtures:
+            text = path.read_text(encoding='utf-8')
+            result_type = scraper_type.get_result_type()
+            expected = parse(result_type, text, 'bs4')
+            for name in backends():
+                actual = parse(result_type, text, name)
+                with self.subTest(fixture=f'{path.parent.name}/{path.name}', parser=name):
+                    self.assertEqual(actual, expected)
+
+    # the parser a result type picked is what it gets
+    def test_retailer_parsers(self):
+        for scraper_type, path in get_fixtures():
+            result_type = scraper_type.get_result_type()
+            text = path.read_text(encoding='utf-8')
+            with self.subTest(fixture=f'{path.parent.name}/{path.name}'):
+                self.assertEqual(parse(result_type, text, result_type.parser), parse(result_type, text, 'bs4'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import logging
+import pathlib
+import unittest
+
+from driver import HttpGetResponse
+from scraper import ScraperFactory
+from scraper.common import SCANNED_PHRASES, GenericScrapeResult
+from scraper.parsers import get_parser
+from scraper.phrases import PhraseScanner
+
+
+TESTS_DIR = pathlib.Path(__file__).parent.parent.absolute()
+
+
+class PhraseScannerTest(unittest.TestCase):
+    def setUp(self):
+        self.scanner = PhraseScanner(['Add to Cart', 'are you a human'])
+
+    def test_scan(self):
+        self.assertEqual(self.scanner.scan('<button>ADD TO CART</button>'), {'add to cart'})
+        self.assertEqual(self.scanner.scan('<p>Are you a human?</p><b>add to cart</b>'), {'add to cart', 'are you a human'})
+        self.assertEqual(self.scanner.scan('<p>add to basket</p>'), set())
+
+    # whatever the page's text has, the raw page has too
+    def test_markup_between_words(self):
+        self.assertEqual(self.scanner.scan('<span>Add to</span>\n  <span>cart</span>'), {'add to cart'})
+        self.assertEqual(self.scanner.scan('add&nbsp;to <!-- a > b --> cart'), {'add to cart'})
+        self.assertEqual(self.scanner.scan('<a title="x>y">add</a> to <script>"</p>"</script>cart'), {'add to cart'})
+
+    def test_markup_inside_words(self):
+        for page in ['Add to Ca<span>rt</span>', 'Add&nbsp;to Ca&shy;rt', 'Are you a hu&#109;an?', 'a<!-- x -->dd <b>t</b>o cart']:
+            with self.subTest(page=page):
+                self.assertTrue(self.scanner.scan(page))
+
+    def test_textarea(self):
+        # tags in a textarea are text
+        self.assertEqual(self.scanner.scan('<textarea>add <b>to</b> cart</textarea>'), set())
+        self.assertEqual(self.scanner.scan('<textarea>add&#32;to cart</textarea>'), {'add to cart'})
+
+    # custom elements named like script or style are ordinary tags
+    def test_custom_elements(self):
+        self.assertEqual(self.scanner.scan('<script-loader></script-loader><div>Add to Cart</div><script>x()</script>'), {'add to cart'})
+        self.assertEqual(self.scanner.scan('<style-guide></style-guide>add to cart<style>a{}</style>'), {'add to cart'})
+        self.assertEqual(self.scanner.scan('<title-bar></title-bar>add to cart<title>x</title>'), {'add to cart'})
+
+    def test_unsupported_markup(self):
+        self.assertEqual(self.scanner.scan('<template><p>sold out</p></template>'), set(self.scanner.phrases))
+
+
+class ScrapeResultTest(unittest.TestCase):
+    def make_result(self, text, content=None):
+        return GenericScrapeResult(logging.getLogger(), HttpGetResponse(text, 'url', content=content), None)
+
+    def test_text_only_when_needed(self):
+        result = self.make_result('<html><body><p>sold out</p></body></html>')
+        self.assertFalse(result)
+        self.assertFalse(result.has_phrase('are you a human'))
+        self.assertNotIn('content', result.__dict__)
+
+    # the text search still runs for a phrase split up by markup
+    def test_markup_inside_words(self):
+        for page in ['<button>Add to Ca<span>rt</span></button>', '<button>Add&nbsp;to Ca&shy;rt</button>']:
+            with self.subTest(page=page):
+                self.assertEqual(bool(self.make_result(f'<html><body>{page}</body></html>')), 'nbsp' not in page)
+        result = self.make_result('<html><body><h1>Are you a hu<b>man</b>?</h1></body></html>')
+        self.assertTrue(result.has_phrase('are you a human'))
+
+    def test_confirmed_in_text(self):
+        # only in a script, so not in the page's text
+        page = '<html><body><script>"add to cart"</script><button>Add to <b>Basket</b></button></body></html>'
+        result = self.make_result(page, content=page.encode())
+        self.assertTrue(result.has_phrase('add to basket'))
+        self.assertFalse(result.has_phrase('add to cart'))
+        self.assertTrue(result)
+
+    def test_custom_elements(self):
+        result = self.make_result('<html><body><script-loader></script-loader><div>Add to Cart</div><script>x()</script></body></html>')
+        self.assertTrue(result)
+
+    def test_unscanned_phrase(self):
+        result = self.make_result('<html><body><p>Notify me</p></body></html>')
+        self.assertTrue(result.has_phrase('notify me'))
+
+    # the scan finds every phrase the text of every fixture has, and on these
+    # pages nothing else, so the text search is skipped wherever it can be
+    def test_fixtures(self):
+        scanner = GenericScrapeResult.scanner
+        for path in sorted(TESTS_DIR.glob('*/*.html')):
+            text = path.read_text(encoding='utf-8')
+            content = get_parser('bs4').parse(text).body.text.lower()
+            with self.subTest(fixture=f'{path.parent.name}/{path.name}'):
+                self.assertEqual(scanner.scan(text), {phrase for phrase in SCANNED_PHRASES if phrase in content})
+
+    def test_results(self):
+        for path in sorted(TESTS_DIR.glob('*/*.html')):
+            result_type = ScraperFactory.get_scraper_type(f'www.{path.parent.name}.com').get_result_type()
+            result = result_type(logging.getLogger(), HttpGetResponse(path.read_text(encoding='utf-8'), None), None)
+            expected = [phrase in result.content for phrase in SCANNED_PHRASES]
+            result = result_type(logging.getLogger(), HttpGetResponse(path.read_text(encoding='utf-8'), None), None)
+            with self.subTest(fixture=f'{path.parent.name}/{path.name}'):
+                self.assertEqual([result.has_phrase(phrase) for phrase in SCANNED_PHRASES], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
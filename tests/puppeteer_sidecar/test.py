@@ -0,0 +1,79 @@
+import pathlib
+import shutil
+import tempfile
+import threading
+import unittest
+
+from config import URL
+from driver import PuppeteerDriver
+
+
+# speaks the same protocol as scrape.js --serve without needing a browser
+FAKE_SIDECAR = '''
+const readline = require('readline');
+process.stdout.write(JSON.stringify({id: 0, ready: true}) + '\\n');
+readline.createInterface({input: process.stdin}).on('line', (line) => {
+    const request = JSON.parse(line);
+    if (request.url.endsWith('/crash')) {
+        process.exit(1);
+    }
+    const message = request.url.endsWith('/broken')
+        ? {id: request.id, error: 'net::ERR_CONNECTION_RESET'}
+        : {id: request.id, status: 200, html: `<html><body>${request.url} ${process.pid}</body></html>`};
+    const delay = request.url.endsWith('/slow') ? 500 : 0;
+    setTimeout(() => process.stdout.write(JSON.stringify(message) + '\\n'), delay);
+});
+'''
+
+
+@unittest.skipIf(shutil.which('node') is None, 'node is not installed')
+class PuppeteerSidecarFixture(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        data_dir = pathlib.Path(self.tmp_dir.name)
+        self.driver = PuppeteerDriver(data_dir=data_dir, timeout=5)
+        self.driver.script_path = data_dir / 'fake_scrape.js'
+        self.driver.script_path.write_text(FAKE_SIDECAR)
+
+    def tearDown(self):
+        self.driver.stop()
+        self.tmp_dir.cleanup()
+
+    def get(self, url):
+        url = URL(url)
+        url.nickname = 'test'
+        return self.driver.get(url)
+
+    def test_sidecar_is_reused(self):
+        first = self.get('https://www.example.com/a')
+        second = self.get('https://www.example.com/b')
+        self.assertIn('https://www.example.com/a', first.text)
+        self.assertIn('https://www.example.com/b', second.text)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.text.split()[-1], second.text.split()[-1])  # same pid
+
+    def test_error(self):
+        self.assertIsNone(self.get('https://www.example.com/broken'))
+
+    def test_restart_after_crash(self):
+        self.get('https://www.example.com/a')
+        with self.assertRaises(Exception):
+            self.get('https://www.example.com/crash')
+        self.driver.process.wait()
+        self.assertIn('https://www.example.com/b', self.get('https://www.example.com/b').text)
+
+    # the old sidecar's reader finishing late doesn't fail what was sent to the new one
+    def test_late_exit_of_old_sidecar(self):
+        self.get('https://www.example.com/a')
+        old_process, old_pending = self.driver.process, self.driver.pending
+        with self.assertRaises(Exception):
+            self.get('https://www.example.com/crash')
+        old_process.wait()
+        responses = []
+        thread = threading.Thread(target=lambda: responses.append(self.get('https://www.example.com/slow')))
+        thread.start()
+        while not self.driver.pending or self.driver.process is old_process:
+            thread.join(0.01)
+        self.driver.read_responses(old_process, old_pending)
+        thread.join()
+        self.assertIn('https://www.example.com/slow', responses[0].text)
@@ -0,0 +1,62 @@
+import unittest
+
+from conftest import FakeClock
+from ratelimit import RateLimiter, TokenBucket
+
+
+class TokenBucketFixture(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=2, burst=3, timefunc=self.clock)
+
+    def test_burst(self):
+        for _ in range(3):
+            self.assertEqual(self.bucket.reserve(), 0.0)
+        self.assertEqual(self.bucket.reserve(), 0.5)
+        self.assertEqual(self.bucket.reserve(), 1.0)
+
+    def test_refill(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        self.clock.now = 10.0
+        for _ in range(3):
+            self.assertEqual(self.bucket.reserve(), 0.0)
+
+
+class RateLimiterFixture(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter({
+            'default': {'rate': 1.0, 'burst': 2},
+            'newegg.com': {'rate': 0.5, 'burst': 1},
+        })
+
+    def test_domain_match(self):
+        self.assertEqual(self.limiter.get_limit('www.newegg.com')['rate'], 0.5)
+        self.assertEqual(self.limiter.get_limit('newegg.com')['rate'], 0.5)
+        self.assertEqual(self.limiter.get_limit('notnewegg.com')['rate'], 1.0)
+
+    def test_buckets_are_per_domain(self):
+        bucket, _ = self.limiter.get_bucket('www.newegg.com')
+        other, _ = self.limiter.get_bucket('www.amazon.com')
+        self.assertIsNot(bucket, other)
+        self.assertIs(bucket, self.limiter.get_bucket('www.newegg.com')[0])
+
+    # one configured domain is one bucket, whichever of its hosts a request goes to
+    def test_hosts_share_the_domain_bucket(self):
+        bucket, _ = self.limiter.get_bucket('www.newegg.com')
+        self.assertIs(bucket, self.limiter.get_bucket('newegg.com')[0])
+        self.assertEqual(self.limiter.reserve('www.newegg.com'), 0.0)
+        self.assertGreater(self.limiter.reserve('newegg.com'), 0.0)
+
+    def test_most_specific_domain(self):
+        limiter = RateLimiter({
+            'newegg.com': {'rate': 0.5, 'burst': 1},
+            'www.newegg.com': {'rate': 2.0, 'burst': 4},
+        })
+        self.assertEqual(limiter.get_limit('www.newegg.com')['rate'], 2.0)
+        self.assertEqual(limiter.get_limit('promotions.newegg.com')['rate'], 0.5)
+        self.assertIsNot(limiter.get_bucket('www.newegg.com')[0], limiter.get_bucket('promotions.newegg.com')[0])
+
+    def test_unlimited(self):
+        limiter = RateLimiter(dict())
+        self.assertEqual(limiter.acquire('www.newegg.com'), 0.0)
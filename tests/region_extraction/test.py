@@ -0,0 +1,85 @@
+import logging
+import pathlib
+import unittest
+
+from driver import HttpGetResponse
+from scraper import ScraperFactory
+from scraper.common import GenericScrapeResult
+from scraper.parsers import extract_regions
+
+
+TESTS_DIR = pathlib.Path(__file__).parent.parent.absolute()
+PAGE = '''<html><head><style>p {}</style></head><body>
+<div id="header">Are you a human?</div>
+<div class="buy-box"><script>var x = "<div>";</script><span class="price">$10</span><STYLE>b {}</STYLE></div>
+<div id="details">Add to cart</div>
+</body></html>'''
+
+
+def get_fixtures():
+    for path in sorted(TESTS_DIR.glob('*/*.html')):
+        result_type = ScraperFactory.get_scraper_type(f'www.{path.parent.name}.com').get_result_type()
+        if result_type.regions:
+            yield result_type, path
+
+
+def parse(result_type, text, regions):
+    result_type = type(result_type.__name__, (result_type,), {'regions': regions})
+    result = result_type(logging.getLogger(), HttpGetResponse(text, None), None)
+    return result, (bool(result), result.price, result.alert_subject, result.alert_content, result.captcha)
+
+
+class ExtractRegionsTest(unittest.TestCase):
+    def test_region(self):
+        region = extract_regions(PAGE, [('class="buy-box"', 'id="details"')])
+        self.assertEqual(region, '<html><body><div class="buy-box"><span class="price">$10</span></div>\n</body></html>')
+
+    def test_several_regions(self):
+        region = extract_regions(PAGE, [('id="header"', 'class="buy-box"'), ('id="missing"', 'id="details"'), ('id="details"', '</body>')])
+        self.assertEqual(region, '<html><body><div id="header">Are you a human?</div>\n<div id="details">Add to cart</div>\n</body></html>')
+
+    # custom elements named like script or style are kept, and so is what follows them
+    def test_custom_elements(self):
+        page = ('<div class="buy-box"><style-guide></style-guide><span class="price">$10</span>'
+                '<button>Add to cart</button><style>a{}</style></div><div id="details">')
+        region = extract_regions(page, [('class="buy-box"', 'id="details"')])
+        self.assertEqual(region, '<html><body><div class="buy-box"><style-guide></style-guide><span class="price">$10</span>'
+                                 '<button>Add to cart</button></div></body></html>')
+
+    def test_anchors_missed(self):
+        self.assertIsNone(extract_regions(PAGE, [('class="buy-box"', 'id="missing"'), ('id="missing"', 'id="details"')]))
+
+    def test_phrases_outside_of_the_region(self):
+        class RegionResult(GenericScrapeResult):
+            regions = (('class="buy-box"', 'id="details"'),)
+
+        result = RegionResult(logging.getLogger(), HttpGetResponse(PAGE, 'url'), None)
+        self.assertTrue(result.region)
+        self.assertIsNone(result.soup.body.find('div', id='header'))
+        self.assertTrue(result.has_phrase('are you a human'))
+        self.assertTrue(result)
+
+
+# parsing the regions of every fixture gives the same results as parsing the whole page
+class FixtureTest(unittest.TestCase):
+    def test_fixtures(self):
+        fixtures = list(get_fixtures())
+        self.assertGreater(len(fixtures), 5)
+        for result_type, path in fixtures:
+            text = path.read_text(encoding='utf-8')
+            full, expected = parse(result_type, text, ())
+            region, actual = parse(result_type, text, result_type.regions)
+            self.assertTrue(region.region, path)
+            self.assertFalse(full.region, path)
+            self.assertEqual(actual, expected, path)
+
+    # a page without the anchors, like a CAPTCHA, is parsed whole
+    def test_fallback(self):
+        result_type, path = next(get_fixtures())
+        result, _ = parse(result_type, '<html><body><form>Are you a human?</form></body></html>', result_type.regions)
+        self.assertFalse(result.region)
+        self.assertTrue(result.has_phrase('are you a human'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import http.server
+import logging
+import os
+import pathlib
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+import requests
+
+from config import URL
+from driver import RequestsDriver
+
+
+NUM_REQUESTS = 50
+PAGE = b'<html><body>' + b'x' * 100000 + b'</body></html>'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('content-type', 'text/html')
+        self.send_header('content-length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# a local HTTPS stand-in for a retailer, counting the connections (and therefore TLS handshakes) it accepts
+@unittest.skipIf(shutil.which('openssl') is None, 'openssl is not installed')
+class RequestsSessionBenchmark(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        tmp = pathlib.Path(cls.tmp_dir.name)
+        cls.cert = tmp / 'cert.pem'
+        key = tmp / 'key.pem'
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                        '-addext', 'subjectAltName=DNS:localhost', '-keyout', str(key), '-out', str(cls.cert)],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        cls.server = http.server.ThreadingHTTPServer(('localhost', 0), Handler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cls.cert, key)
+        cls.server.socket = context.wrap_socket(cls.server.socket, server_side=True)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = URL(f'https://localhost:{cls.server.server_address[1]}/product')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.tmp_dir.cleanup()
+
+    def setUp(self):
+        self.server.connections = 0
+        self.env = unittest.mock.patch.dict(os.environ, {'REQUESTS_CA_BUNDLE': str(self.cert)})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+
+    def benchmark(self, get):
+        start = time.perf_counter()
+        for _ in range(NUM_REQUESTS):
+            self.assertEqual(len(get().text), len(PAGE))
+        return time.perf_counter() - start
+
+    def test_handshakes(self):
+        # what RequestsDriver used to do: a module-level requests.get per scrape
+        baseline = self.benchmark(lambda: requests.get(str(self.url), timeout=5))
+        baseline_connections = self.server.connections
+
+        self.server.connections = 0
+        driver = RequestsDriver(timeout=5)
+        pooled = self.benchmark(lambda: driver.get(self.url))
+        pooled_connections = self.server.connections
+
+        logging.info(f'{NUM_REQUESTS} requests: {baseline_connections} handshakes in {baseline:.3f}s without sessions, '
+                     f'{pooled_connections} handshakes in {pooled:.3f}s with per-domain sessions')
+        self.assertEqual(baseline_connections, NUM_REQUESTS)
+        self.assertEqual(pooled_connections, 1)
+
+    def test_session_per_domain(self):
+        driver = RequestsDriver(timeout=5)
+        self.assertIs(driver.get_session('www.newegg.com'), driver.get_session('www.newegg.com'))
+        self.assertIsNot(driver.get_session('www.newegg.com'), driver.get_session('www.amazon.com'))
@@ -0,0 +1,72 @@
+import gc
+import tempfile
+import tracemalloc
+import unittest
+
+from config import URL
+from conftest import FakeDriverRepo, PageDriver
+from scraper.common import GenericScraper, ResultSnapshot
+
+
+# about 25KB, most of it markup which ends up in the parse tree
+PAGE = '<html><body>' + ''.join(f'<div class="row"><span>item {i}</span></div>' for i in range(600)) + \
+       '<button>Add to Cart</button></body></html>'
+
+
+class ResultSnapshotTest(unittest.TestCase):
+    def test_immutable(self):
+        snapshot = ResultSnapshot(in_stock=True, price=10.0, alert_content='url')
+        with self.assertRaises(AttributeError):
+            snapshot.price = 5.0
+        with self.assertRaises(AttributeError):
+            snapshot.soup = None
+        self.assertFalse(hasattr(snapshot, '__dict__'))
+
+    def test_replace(self):
+        snapshot = ResultSnapshot(in_stock=True, price=10.0, phrases=frozenset(['are you a human']))
+        reused = snapshot.reuse()
+        self.assertEqual((reused.in_stock, reused.price, reused.last_price), (True, 10.0, 10.0))
+        self.assertTrue(reused.previously_in_stock and reused.unchanged)
+        self.assertGreaterEqual(reused.timestamp, snapshot.timestamp)
+        self.assertTrue(reused.has_phrase('are you a human'))
+        self.assertEqual(snapshot.replace(price=None).price, None)
+        with self.assertRaises(Exception):
+            snapshot.has_phrase('add to cart')
+        with self.assertRaises(Exception):
+            ResultSnapshot(soup=None)
+
+
+class RetainedMemoryTest(unittest.TestCase):
+    def scrape_all(self, drivers, count):
+        scrapers = [GenericScraper(drivers, URL(f'https://www.example.com/p/{i}')) for i in range(count)]
+        for scraper in scrapers:
+            scraper.scrape()
+        return scrapers
+
+    # what the scrapers keep between scrapes doesn't grow with the size of the pages
+    def test_memory_stays_flat(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            drivers = FakeDriverRepo(tmp, {'requests': PageDriver(PAGE)})
+            self.scrape_all(drivers, 2)  # warm up caches and loggers
+
+            curve = []
+            tracemalloc.start()
+            try:
+                for count in [4, 8, 16]:
+                    gc.collect()
+                    before = tracemalloc.get_traced_memory()[0]
+                    scrapers = self.scrape_all(drivers, count)
+                    gc.collect()
+                    curve.append((count, tracemalloc.get_traced_memory()[0] - before))
+                    self.assertTrue(all(isinstance(s.last_result, ResultSnapshot) and s.last_result for s in scrapers))
+                    del scrapers
+            finally:
+                tracemalloc.stop()
+
+        per_url = (curve[-1][1] - curve[0][1]) / (curve[-1][0] - curve[0][0])
+        # a few KB per url, while the page alone is several times that (and its tree far more)
+        self.assertLess(per_url, len(PAGE) / 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from conftest import FakeClock
+from scheduler import LagStats, Scheduler
+
+
+class SchedulerFixture(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = Scheduler(timefunc=self.clock)
+
+    def test_empty(self):
+        self.assertFalse(self.scheduler)
+        self.assertIsNone(self.scheduler.delay())
+
+    def test_pops_in_due_order(self):
+        self.scheduler.enter(3.0, 'c')
+        self.scheduler.enter(1.0, 'a')
+        self.scheduler.enter(2.0, 'b')
+        self.clock.now = 2.5
+        self.assertEqual([job for _, job in self.scheduler.pop_due()], ['a', 'b'])
+        self.assertEqual(self.scheduler.delay(), 0.5)
+
+    def test_cadence_is_independent_of_job_count(self):
+        for i in range(100):
+            self.scheduler.enter(1.0, i)
+        self.scheduler.enter(1.0, 'late')
+        self.clock.now = 1.0
+        popped = [job for _, job in self.scheduler.pop_due()]
+        self.assertEqual(len(popped), 101)
+        self.assertEqual(popped[-1], 'late')
+
+
+class LagStatsFixture(unittest.TestCase):
+    def test_lag(self):
+        stats = LagStats()
+        stats.record(1.0)
+        stats.record(3.0)
+        stats.record(-1.0)  # early starts count as no lag
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(stats.max, 3.0)
+        self.assertAlmostEqual(stats.get_mean(), 4.0 / 3)
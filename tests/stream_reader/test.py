@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import pathlib
+import threading
+import unittest
+
+import aiohttp
+import aiohttp.web
+
+from config import URL
+from driver import HttpGetResponse, RequestsDriver
+from scraper.amazon import AmazonScraper
+from scraper.newegg import NeweggScraper
+from streaming import CHUNK_SIZE, StreamReader
+from worker.lean_and_mean import LeanAndMeanServer
+
+
+TESTS_DIR = pathlib.Path(__file__).parent.parent.absolute()
+MARKER = b'<div id="details">'
+HEAD = b'<html><body><button>Add to Cart</button>' + b'x' * 50000
+TAIL = b'y' * 2000000 + b'</body></html>'
+
+
+class StreamReaderTest(unittest.TestCase):
+    def test_marker_across_chunks(self):
+        reader = StreamReader([MARKER])
+        self.assertFalse(reader.feed(b'abc<div id="de'))
+        self.assertTrue(reader.feed(b'tails">def'))
+        self.assertTrue(reader.truncated)
+        self.assertEqual(reader.body, b'abc<div id="details">def')
+
+    def test_str_markers(self):
+        reader = StreamReader(['id="details"'])
+        self.assertTrue(reader.feed(MARKER))
+
+    def test_max_bytes(self):
+        reader = StreamReader(max_bytes=10)
+        self.assertFalse(reader.feed(b'12345'))
+        self.assertTrue(reader.feed(b'6789012345'))
+        self.assertEqual(reader.body, b'1234567890')
+
+    def test_exactly_max_bytes(self):
+        reader = StreamReader(max_bytes=10)
+        self.assertFalse(reader.feed(b'12345'))
+        self.assertFalse(reader.feed(b'67890'))
+        self.assertFalse(reader.truncated)
+        self.assertTrue(reader.feed(b'1'))
+        self.assertEqual(reader.body, b'1234567890')
+
+    def test_whole_page(self):
+        reader = StreamReader([MARKER], max_bytes=100)
+        self.assertFalse(reader.feed(b'<html></html>'))
+        self.assertFalse(reader.truncated)
+
+
+# parsing a page cut off after the scraper's stop markers gives the same result as the whole page
+class FixtureTest(unittest.TestCase):
+    def parse(self, scraper_type, content):
+        response = HttpGetResponse(content.decode('utf-8', errors='replace'), None)
+        result = scraper_type.get_result_type()(logging.getLogger(), response, None)
+        return bool(result), result.price, result.alert_subject, result.alert_content
+
+    def check(self, scraper_type, filename):
+        with open(TESTS_DIR / filename, 'rb') as f:
+            content = f.read()
+        reader = StreamReader(scraper_type.get_stop_markers())
+        for i in range(0, len(content), CHUNK_SIZE):
+            if reader.feed(content[i:i + CHUNK_SIZE]):
+                break
+        self.assertTrue(reader.truncated, filename)
+        self.assertLess(reader.size, len(content))
+        self.assertEqual(self.parse(scraper_type, reader.body), self.parse(scraper_type, content), filename)
+
+    def test_amazon(self):
+        for filename in ['in_stock.html', 'in_stock_de.html', 'out_of_stock.html']:
+            self.check(AmazonScraper, f'amazon/{filename}')
+
+    def test_newegg(self):
+        for filename in ['in_stock.html', 'out_of_stock.html', 'bundle_in_stock.html', 'bundle_out_of_stock.html']:
+            self.check(NeweggScraper, f'newegg/{filename}')
+
+
+# a local retailer which sends its page in chunks and remembers how much it got to send
+class Upstream:
+    def __init__(self):
+        self.sent = 0
+        self.done = threading.Event()
+
+    async def handler(self, request):
+        response = aiohttp.web.StreamResponse()
+        response.content_type = 'text/html'
+        await response.prepare(request)
+        body = HEAD + MARKER + TAIL
+        self.sent = 0
+        try:
+            for i in range(0, len(body), CHUNK_SIZE):
+                await response.write(body[i:i + CHUNK_SIZE])
+                self.sent += CHUNK_SIZE
+                await asyncio.sleep(0.001)
+            await response.write_eof()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.done.set()
+        return response
+
+    async def start(self):
+        app = aiohttp.web.Application()
+        app.router.add_get('/{tail:.*}', self.handler)
+        self.runner = aiohttp.web.AppRunner(app)
+        await self.runner.setup()
+        site = aiohttp.web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+
+class StreamingDriverTest(unittest.TestCase):
+    def setUp(self):
+        self.upstream = Upstream()
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        port = asyncio.run_coroutine_threadsafe(self.upstream.start(), self.loop).result()
+        self.url = URL(f'http://127.0.0.1:{port}/p/1')
+        self.url.stop_markers = (MARKER,)
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.upstream.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def check(self, response):
+        self.assertTrue(response.truncated)
+        self.assertIn('Add to Cart', response.text)
+        self.assertLess(len(response.content), len(HEAD) + 2 * CHUNK_SIZE)
+        # the upstream notices the hunter went away long before the end of the page
+        self.assertTrue(self.upstream.done.wait(10))
+        self.assertLess(self.upstream.sent, len(TAIL) / 2)
+
+    def test_requests(self):
+        driver = RequestsDriver(timeout=10, streaming=True)
+        self.check(driver.get(self.url))
+
+    def test_requests_async(self):
+        driver = RequestsDriver(timeout=10, streaming=True)
+
+        async def run():
+            response = await driver.get_async(self.url)
+            await driver.close_async()
+            return response
+
+        self.check(asyncio.run(run()))
+
+    def test_max_bytes(self):
+        driver = RequestsDriver(timeout=10, streaming=True, max_bytes=1000)
+        self.url.stop_markers = ()
+        response = driver.get(self.url)
+        self.assertTrue(response.truncated)
+        self.assertEqual(len(response.content), 1000)
+
+    def test_not_streaming(self):
+        driver = RequestsDriver(timeout=10)
+        response = driver.get(self.url)
+        self.assertFalse(response.truncated)
+        self.assertTrue(response.text.endswith('</body></html>'))
+
+    def test_worker(self):
+        server = LeanAndMeanServer(endpoint=None)
+
+        async def run():
+            page = await server.fetch(str(self.url), 10, stop_markers=(MARKER,))
+            await server.close()
+            return page
+
+        page = asyncio.run(run())
+        self.assertTrue(page.truncated)
+        self.assertLess(len(page.body), len(HEAD) + 2 * CHUNK_SIZE)
+        self.assertTrue(self.upstream.done.wait(10))
+        self.assertLess(self.upstream.sent, len(TAIL) / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
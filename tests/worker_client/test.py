@@ -0,0 +1,268 @@
+import asyncio
+import concurrent.futures
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import worker.worker_pb2 as spec
+from worker.client import Client
+from worker.registry import Endpoint
+from worker.server import Page, Server
+
+
+class EchoServer(Server):
+    def __init__(self):
+        super().__init__(None)
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        await super().handle(reader, writer)
+
+    async def handle_request(self, request):
+        if request.url.endswith('/fail'):
+            raise Exception('upstream exploded')
+        # answer out of order: later requests may finish first
+        await asyncio.sleep(0.01 * (request.id % 5))
+        body = f'<html><body>{request.url} {"ü" * 2000}</body></html>'.encode('latin-1')
+        return Page(body, 200, charset='iso-8859-1', final_url=request.url, headers=[('content-type', 'text/html')], fetch_ms=7)
+
+
+# runs a worker server on a background event loop
+class ServerThread:
+    def __init__(self, server):
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.start()
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def start(self, port=0):
+        async def start():
+            return await asyncio.start_server(self.server.handle, '127.0.0.1', port)
+        self.listener = self.call(start())
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    def stop(self):
+        async def stop():
+            self.listener.close()
+            await self.listener.wait_closed()
+        self.call(stop())
+
+
+class ClientFixture(unittest.TestCase):
+    def setUp(self):
+        self.server = EchoServer()
+        self.thread = ServerThread(self.server)
+        self.client = Client(Endpoint(__file__, '127.0.0.1', self.thread.port))
+
+    def tearDown(self):
+        self.client.close()
+        self.thread.stop()
+
+    def test_pipelined_requests_share_one_connection(self):
+        urls = [f'https://www.newegg.com/p/{i}' for i in range(20)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
+            responses = list(executor.map(lambda url: self.client.get(url=url, timeout=5), urls))
+        for url, response in zip(urls, responses):
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(url.encode(), response.body)
+        self.assertEqual(len(set(r.id for r in responses)), len(urls))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_raw_body_and_metadata(self):
+        response = self.client.get(url='https://www.newegg.com/p/1', timeout=5)
+        self.assertEqual(response.charset, 'iso-8859-1')
+        self.assertIn('ü' * 2000, response.body.decode(response.charset))
+        self.assertEqual(response.final_url, 'https://www.newegg.com/p/1')
+        self.assertEqual([(h.name, h.value) for h in response.headers], [('content-type', 'text/html')])
+        self.assertEqual(response.fetch_ms, 7)
+
+    def test_compression(self):
+        client = Client(Endpoint(__file__, '127.0.0.1', self.thread.port), compression='gzip')
+        self.addCleanup(client.close)
+        request = spec.Request()
+        request.ParseFromString(client.encode_request(1, 'https://www.newegg.com/p/1', 5))
+        self.assertEqual(list(request.accept_compression), [spec.GZIP])
+
+        page = Page(b'x' * 5000, 200)
+        response = spec.Response()
+        response.ParseFromString(self.server.encode_response(request, page))
+        self.assertEqual(response.compression, spec.GZIP)
+        self.assertLess(len(response.body), 5000)
+
+        response = client.get(url='https://www.newegg.com/p/1', timeout=5)
+        self.assertEqual(response.compression, spec.NONE)
+        self.assertIn(b'https://www.newegg.com/p/1', response.body)
+
+    def test_version_1_request(self):
+        request = spec.Request()
+        request.id = 1
+        response = spec.Response()
+        response.ParseFromString(self.server.encode_response(request, Page('grüße'.encode(), 200, charset='utf-8')))
+        self.assertEqual(response.data, 'grüße')
+        self.assertFalse(response.HasField('body'))
+
+    def test_failed_request(self):
+        response = self.client.get(url='https://www.newegg.com/fail', timeout=5)
+        self.assertEqual(response.status_code, 0)
+        self.assertEqual(self.client.get(url='https://www.newegg.com/ok', timeout=5).status_code, 200)
+
+    def test_get_async(self):
+        async def get():
+            return await self.client.get_async(url='https://www.newegg.com/async', timeout=5)
+        self.assertEqual(asyncio.run(get()).status_code, 200)
+
+    def test_reconnect(self):
+        self.client.get(url='https://www.newegg.com/1', timeout=5)
+        # drop the client's connection from the server side
+        self.client.get_loop().call_soon_threadsafe(self.client.connections[0].writer.transport.abort)
+        self.assertEqual(self.client.get(url='https://www.newegg.com/2', timeout=5).status_code, 200)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_close(self):
+        self.client.get(url='https://www.newegg.com/1', timeout=5)
+        loop = self.client.get_loop()
+        self.client.close()
+        self.assertTrue(loop.is_closed())
+        self.assertIsNone(self.client.connections[0].writer)
+        # a closed client starts over on the next request
+        self.assertEqual(self.client.get(url='https://www.newegg.com/2', timeout=5).status_code, 200)
+        self.assertEqual(self.server.connections, 2)
+
+
+# finds two consecutive free ports for a two-process worker
+def find_port_pair():
+    for _ in range(20):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        try:
+            with socket.socket() as s:
+                s.bind(('127.0.0.1', port + 1))
+            return port
+        except OSError:
+            continue
+    raise Exception('no consecutive free ports')
+
+
+class SlowServer(EchoServer):
+    async def handle_request(self, request):
+        await asyncio.sleep(0.2)
+        return Page(b'<html></html>', 200)
+
+
+class MultiProcessClientFixture(unittest.TestCase):
+    def setUp(self):
+        port = find_port_pair()
+        self.servers = [SlowServer(), SlowServer()]
+        self.threads = [ServerThread(server) for server in self.servers]
+        for i, thread in enumerate(self.threads):
+            thread.stop()
+            thread.start(port + i)
+        self.client = Client(Endpoint(__file__, '127.0.0.1', port), processes=2)
+        self.client.health_check_interval = 0.1
+
+    def tearDown(self):
+        self.client.close()
+        for thread in self.threads:
+            thread.stop()
+
+    def get_many(self, n):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=n) as executor:
+            return list(executor.map(lambda i: self.client.get(url=f'https://www.newegg.com/p/{i}', timeout=5), range(n)))
+
+    def test_least_outstanding_requests(self):
+        responses = self.get_many(10)
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertEqual([c.endpoint.port for c in self.client.connections], [self.threads[0].port, self.threads[1].port])
+        self.assertEqual([s.connections for s in self.servers], [1, 1])
+
+    def test_dead_worker(self):
+        self.get_many(4)
+
+        # kill the second worker: its connection goes away and it stops accepting new ones
+        self.threads[1].stop()
+        self.client.get_loop().call_soon_threadsafe(self.client.connections[1].writer.transport.abort)
+        responses = self.get_many(4)
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertFalse(self.client.connections[1].alive)
+
+        # the health check brings it back once it is up again
+        self.threads[1].start(self.threads[1].port)
+        deadline = time.monotonic() + 5
+        while not self.client.connections[1].alive and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(self.client.connections[1].alive)
+
+
+class BusyServerFixture(unittest.TestCase):
+    def setUp(self):
+        self.server = SlowServer()
+        self.server.max_in_flight = 2
+        self.server.max_queued = 2
+        self.thread = ServerThread(self.server)
+        self.client = Client(Endpoint(__file__, '127.0.0.1', self.thread.port))
+
+    def tearDown(self):
+        self.client.close()
+        self.thread.stop()
+
+    def get_many(self, n):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=n) as executor:
+            return list(executor.map(lambda i: self.client.get(url=f'https://www.newegg.com/p/{i}', timeout=5), range(n)))
+
+    def test_busy(self):
+        self.client.busy_retries = 0
+        responses = self.get_many(10)
+        self.assertEqual(sum(r.status_code == 200 for r in responses), 4)
+        self.assertEqual(sum(r.busy for r in responses), 6)
+        self.assertTrue(all(r.status_code == 0 for r in responses if r.busy))
+
+    def test_retry_with_jitter(self):
+        self.client.busy_retries = 6
+        self.client.busy_backoff = 0.2
+        responses = self.get_many(10)
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertEqual((self.server.in_flight, self.server.queued), (0, 0))
+
+
+class UnixSocketFixture(unittest.TestCase):
+    def serve(self, endpoint):
+        self.server = EchoServer()
+        self.thread = ServerThread(self.server)
+        self.thread.stop()
+        self.thread.listener = self.thread.call(endpoint.start_server(self.server.handle))
+        self.addCleanup(self.thread.stop)
+        client = Client(endpoint, processes=2)
+        self.addCleanup(client.close)
+        return client
+
+    def test_socket_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            endpoint = Endpoint(__file__, '127.0.0.1', 0, path=os.path.join(tmp, 'worker.sock'))
+            client = self.serve(endpoint)
+            response = client.get(url='https://www.newegg.com/p/1', timeout=5)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.server.connections, 1)
+            self.assertEqual(repr(client.connections[1].endpoint), f'test@unix:{tmp}/worker.sock.1')
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'abstract sockets are linux only')
+    def test_abstract_socket(self):
+        endpoint = Endpoint(__file__, '127.0.0.1', 0, path=f'@inventory-hunter-test-{os.getpid()}')
+        client = self.serve(endpoint)
+        self.assertEqual(client.get(url='https://www.newegg.com/p/1', timeout=5).status_code, 200)
+
+    def test_stale_socket_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'worker.sock')
+            with socket.socket(socket.AF_UNIX) as s:
+                s.bind(path)
+            client = self.serve(Endpoint(__file__, '127.0.0.1', 0, path=path))
+            self.assertEqual(client.get(url='https://www.newegg.com/p/1', timeout=5).status_code, 200)
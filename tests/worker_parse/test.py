@@ -0,0 +1,73 @@
+import concurrent.futures
+import logging
+import pathlib
+import unittest
+
+import worker.worker_pb2 as spec
+from driver import HttpGetResponse
+from scraper.common import ParsedScrapeResult
+from scraper.newegg import NeweggScrapeResult
+from worker.lean_and_mean import LeanAndMeanServer
+from worker.parse import parse_page
+from worker.server import Page
+
+
+NEWEGG_DIR = pathlib.Path(__file__).parent.parent.absolute() / 'newegg'
+URL = 'https://www.newegg.com/p/N82E16814137598'
+
+
+def load_body(filename):
+    with open(NEWEGG_DIR / filename, 'rb') as f:
+        return f.read()
+
+
+# sends a parsed page through the worker protocol and builds the hunter's result from it
+def round_trip(result, last_result=None):
+    request = spec.Request()
+    request.id = 1
+    request.version = 2
+    request.parse = True
+    page = Page(b'<html></html>', 200, result=result)
+
+    response = spec.Response()
+    response.ParseFromString(LeanAndMeanServer().encode_response(request, page))
+    r = HttpGetResponse('', URL, status_code=response.status_code, result=response.result)
+    return response, ParsedScrapeResult(logging.getLogger(), r, last_result)
+
+
+class ParsePageTest(unittest.TestCase):
+    def test_same_as_local_parse(self):
+        for filename in ('in_stock.html', 'out_of_stock.html', 'bundle_in_stock.html', 'bundle_out_of_stock.html'):
+            body = load_body(filename)
+            local = NeweggScrapeResult(logging.getLogger(), HttpGetResponse(body.decode('utf-8'), URL), None)
+            _, parsed = round_trip(parse_page(URL, 'www.newegg.com', body, 'utf-8', 200))
+            self.assertEqual(bool(parsed), bool(local), filename)
+            self.assertEqual(parsed.price, local.price, filename)
+            self.assertEqual(parsed.alert_subject, local.alert_subject, filename)
+            self.assertEqual(parsed.alert_content, local.alert_content, filename)
+
+    def test_in_process_pool(self):
+        body = load_body('bundle_in_stock.html')
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            result = executor.submit(parse_page, URL, 'www.newegg.com', body, 'utf-8', 200).result()
+        self.assertTrue(result['in_stock'])
+        self.assertEqual(result['price'], 541.98)
+
+    def test_response_has_no_body(self):
+        response, _ = round_trip(parse_page(URL, 'www.newegg.com', load_body('in_stock.html'), 'utf-8', 200))
+        self.assertEqual(response.body, b'')
+        self.assertTrue(response.HasField('result'))
+
+    def test_reported_phrases(self):
+        body = b'<html><body>Are you a human?</body></html>'
+        _, parsed = round_trip(parse_page('https://example.com', 'example.com', body, None, 200))
+        self.assertFalse(parsed)
+        self.assertTrue(parsed.has_phrase('are you a human'))
+        with self.assertRaises(Exception):
+            parsed.has_phrase('add to cart')
+
+    def test_previous_result(self):
+        _, first = round_trip(parse_page(URL, 'www.newegg.com', load_body('bundle_in_stock.html'), 'utf-8', 200))
+        _, second = round_trip(parse_page(URL, 'www.newegg.com', load_body('bundle_out_of_stock.html'), 'utf-8', 200), first)
+        self.assertTrue(second.previously_in_stock)
+        self.assertEqual(second.last_price, first.price)
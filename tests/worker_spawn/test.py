@@ -0,0 +1,98 @@
+import os
+import signal
+import socket
+import tempfile
+import time
+import unittest
+
+from unittest import mock
+
+import worker
+from worker.lean_and_mean import LeanAndMeanServer
+from worker.spawn import ProcessWorker, SharedWorker, is_listening, wait_until_ready
+from worker.registry import Endpoint
+
+
+def find_free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(condition, timeout=15):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class ThreadWorkerTest(unittest.TestCase):
+    def test_spawn_on_thread(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, 'lean_and_mean.sock')
+            spawned = worker.init_worker('lean_and_mean', 'thread', socket=socket_path, timeout=10)
+            self.assertTrue(is_listening(spawned.endpoint))
+
+            # the client can use it right away, without any connection refused errors
+            client = worker.init_client('lean_and_mean', socket=socket_path)
+            self.addCleanup(client.close)
+            response = client.get(url='http://127.0.0.1:1/unreachable', timeout=2)
+            self.assertEqual(response.status_code, 0)
+            self.assertFalse(response.busy)
+
+    def test_thread_runs_a_single_process(self):
+        with self.assertRaises(Exception):
+            worker.init_worker('lean_and_mean', 'thread', processes=2)
+
+
+class ProcessWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)  # run_worker.py writes its log file to the working directory
+        self.endpoint = LeanAndMeanServer._endpoint.with_path(os.path.join(self.tmp.name, 'lean_and_mean.sock'))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_restart_after_crash(self):
+        spawned = ProcessWorker(self.endpoint, 2)
+        self.addCleanup(spawned.stop)
+        spawned.start()
+        wait_until_ready(self.endpoint, 2, timeout=30)
+
+        first = spawned.process
+        os.kill(first.pid, signal.SIGKILL)
+        self.assertTrue(wait_for(lambda: spawned.process is not first and spawned.process.poll() is None))
+        wait_until_ready(self.endpoint, 2, timeout=30)
+
+    def test_shared(self):
+        first = SharedWorker(self.endpoint, 1)
+        second = SharedWorker(self.endpoint, 1)
+        for spawned in (first, second):
+            self.addCleanup(spawned.stop)
+            spawned.start()
+        wait_until_ready(self.endpoint, 1, timeout=30)
+        self.assertTrue(wait_for(lambda: first.owner or second.owner))
+        time.sleep(0.5)
+        self.assertNotEqual(first.owner, second.owner)
+
+    # on windows, where there are no file locks, only the shared mode is unavailable
+    def test_shared_without_fcntl(self):
+        with mock.patch('worker.spawn.fcntl', None):
+            with self.assertRaisesRegex(Exception, 'fcntl'):
+                SharedWorker(self.endpoint, 1)
+
+    def test_existing_worker_is_used(self):
+        endpoint = Endpoint('lean_and_mean', '127.0.0.1', find_free_port())
+        with socket.socket() as listener:
+            listener.bind((endpoint.addr, endpoint.port))
+            listener.listen()
+            spawned = ProcessWorker(endpoint, 1)
+            self.addCleanup(spawned.stop)
+            spawned.start()
+            time.sleep(0.5)
+            self.assertIsNone(spawned.process)